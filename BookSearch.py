@@ -5,21 +5,192 @@
 # BookSearch.py
 
 import argparse
-import os
+from datetime import datetime
+import time
 
-from gui.gui import main_window, retrieve_search_items
-from db.database_operations import db_create_db
+from db.database_operations import (db_set_path, db_create_db, db_connect, db_search_found_items, db_rekey_found_items,
+                                    db_get_run_history, db_get_slow_searches, db_prune_found_items,
+                                    import_search_list, export_search_list, export_item_events, EVENT_FORMATS)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Book Search Application")
+    parser.add_argument("--db", metavar="PATH",
+                        help="Database file (default: $BOOKSEARCH_DB, else bin/BookSearch.db)")
     parser.add_argument("-r", "--retrieve", action="store_true", help="Retrieve search items")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent fetches during retrieval")
+    parser.add_argument("--rate", type=float, default=1.0, help="Max requests per second per host")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every page even if unchanged since the last run")
+    parser.add_argument("--max-pages", type=int, default=20, help="Max result pages per search string")
+    parser.add_argument("--full-sweep", action="store_true", help="Walk every page and remove vanished items for all searches")
+    parser.add_argument("--all", action="store_true", help="Check every search string, not just the ones due")
+    parser.add_argument("--max-searches", type=int, help="Max search strings to check in this run")
+    parser.add_argument("--report-format", action="append", choices=["text", "html", "jsonl"],
+                        help="Report log format(s) to append to (default: text)")
+    parser.add_argument("--email-format", choices=["text", "html", "jsonl"], default="text", help="Email body format")
+    parser.add_argument("--no-email", action="store_true", help="Queue the digest in the outbox without sending it")
+    parser.add_argument("--send-outbox", action="store_true", help="Send pending outbox emails and exit")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and retrieve on an interval")
+    parser.add_argument("--interval", type=float, default=60, help="Minutes between daemon retrieval cycles")
+    parser.add_argument("--shard", metavar="RUN_ID",
+                        help="Work on a sharded run with other worker processes on this machine "
+                             "(same RUN_ID joins the same run)")
+    parser.add_argument("--worker-name", help="Name of this shard worker (default: host:pid)")
+    parser.add_argument("--batch-size", type=int, default=10, help="Searches a shard worker claims at a time")
+    parser.add_argument("--lease", type=float, default=10, help="Minutes a shard worker's claim lasts unless renewed")
+    parser.add_argument("--import", dest="import_path", metavar="PATH", help="Add search strings from a CSV/text file, one per line")
+    parser.add_argument("--export", dest="export_path", metavar="PATH", help="Write all search strings to a CSV/text file, one per line")
+    parser.add_argument("--export-events", metavar="DIR",
+                        help="Write found item adds/deletes since the last export to DIR as a new part file")
+    parser.add_argument("--events-format", choices=EVENT_FORMATS, default="jsonl",
+                        help="Format of --export-events parts (parquet needs pyarrow)")
+    parser.add_argument("-s", "--search", metavar="QUERY", help="Search all found items and print the best matches")
+    parser.add_argument("--limit", type=int, default=50, help="Max results for --search")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the retrieval run (bin/retrieve.prof) and write bin/booksearch.prom metrics")
+    parser.add_argument("--history", type=int, nargs="?", const=10, metavar="N",
+                        help="Show the last N runs and the slowest searches of the past week")
+    parser.add_argument("--retention", type=float, metavar="DAYS",
+                        help="Delete found items posted more than DAYS ago. With -r/--daemon/--shard older "
+                             "results are also ignored; on its own it prunes once and exits")
+    parser.add_argument("--rekey", action="store_true",
+                        help="Recompute found item keys after changing bin/normalize_rules.json")
     args = parser.parse_args()
 
+    if args.db:
+        db_set_path(args.db)
+
+    if args.import_path or args.export_path:
+        db_create_db()
+        conn = db_connect()
+        if args.import_path:
+            added, duplicates = import_search_list(conn, args.import_path)
+            print(f"Added {added} search string(s), {duplicates} duplicate(s) skipped")
+        if args.export_path:
+            count = export_search_list(conn, args.export_path)
+            print(f"Exported {count} search string(s) to {args.export_path}")
+        conn.close()
+        exit()
+
+    if args.export_events:
+        db_create_db()
+        conn = db_connect()
+        try:
+            count, path = export_item_events(conn, args.export_events, args.events_format)
+        except ImportError as e:
+            exit(str(e))
+        finally:
+            conn.close()
+        print(f"Exported {count} event(s) to {path}" if path else "No new events to export")
+        exit()
+
+    if args.history:
+        db_create_db()
+        conn = db_connect()
+        print("{:<20} {:>8} {:>8} {:>6} {:>8} {:>6} {:>7} {:>6}".format(
+            "Started", "Seconds", "Searches", "Pages", "KB", "Added", "Deleted", "Errors"))
+        for _, started_at, total_seconds, searches, pages, size, added, deleted, errors in \
+                db_get_run_history(conn, args.history):
+            print("{:<20} {:>8.1f} {:>8} {:>6} {:>8.0f} {:>6} {:>7} {:>6}".format(
+                datetime.fromtimestamp(started_at).strftime('%Y-%m-%d %H:%M:%S'), total_seconds, searches,
+                pages, size / 1024, added, deleted, errors))
+        print()
+        print("{:<40} {:>6} {:>9} {:>9} {:>6}".format("Slowest searches (7 days)", "Checks", "Avg sec", "Fetch",
+                                                      "Errors"))
+        for search_string, checks, average, fetch, errors in db_get_slow_searches(conn, time.time() - 7 * 86400):
+            print("{:<40} {:>6} {:>9.2f} {:>9.2f} {:>6}".format(search_string[:40], checks, average, fetch, errors))
+        conn.close()
+        exit()
+
+    if args.retention is not None and not (args.retrieve or args.daemon or args.shard):
+        db_create_db()
+        conn = db_connect()
+        deleted = db_prune_found_items(conn, int(time.time() - args.retention * 86400))
+        if deleted is not None:
+            print(f"Pruned {deleted} item(s) posted more than {args.retention:g} day(s) ago")
+        conn.close()
+        exit()
+
+    if args.rekey:
+        db_create_db()
+        conn = db_connect()
+        if db_rekey_found_items(conn):
+            print("Found item keys recomputed")
+        conn.close()
+        exit()
+
+    if args.search:
+        db_create_db()
+        conn = db_connect()
+        for item in db_search_found_items(conn, args.search, args.limit):
+            print("{:<5} {:<30} {:<30} {:<20} {:<15}".format(*('' if value is None else value for value in item[2:7])))
+        conn.close()
+        exit()
+
+    if args.send_outbox:
+        from retrieval.notify import send_outbox
+
+        db_create_db()
+        conn = db_connect()
+        sent, failed = send_outbox(conn)
+        print(f"Sent {sent} message(s), {failed} failed")
+        conn.close()
+        exit()
+
+    if args.daemon:
+        # One warm process; SIGTERM stops it, SIGHUP starts a cycle now
+        from retrieval.daemon import run_daemon
+
+        db_create_db()
+        run_daemon(interval=args.interval * 60, workers=args.workers, rate=args.rate,
+                   use_cache=not args.no_cache, max_pages=args.max_pages,
+                   schedule=not args.all, max_searches=args.max_searches,
+                   log_formats=args.report_format or ('text',), email_format=args.email_format,
+                   send_email=not args.no_email, retention_days=args.retention)
+        exit()
+
+    if args.shard:
+        # One of several workers sharing a run; the last one to finish
+        # writes the report and sends the digest
+        from retrieval.shard import run_shard_worker
+
+        db_create_db()
+        retrieved, error_log = run_shard_worker(args.shard, worker=args.worker_name, batch_size=args.batch_size,
+                                                lease_seconds=int(args.lease * 60), workers=args.workers,
+                                                rate=args.rate, use_cache=not args.no_cache,
+                                                max_pages=args.max_pages, force_full_sweep=args.full_sweep,
+                                                schedule=not args.all, max_searches=args.max_searches,
+                                                log_formats=args.report_format or ('text',),
+                                                email_format=args.email_format, send_email=not args.no_email,
+                                                retention_days=args.retention)
+        print(f"Retrieved {retrieved} search(es), {len(error_log)} error(s)")
+        exit()
+
     if args.retrieve:
-        # Perform retrieval logic here
+        # Perform retrieval logic here. Headless run: only the scrape
+        # pipeline is imported, not tkinter/pandas
+        from retrieval import retrieve_search_items
+
         db_create_db()  # Ensure the database is created before retrieval
-        retrieve_search_items()
+        retrieve_options = dict(workers=args.workers, rate=args.rate, use_cache=not args.no_cache,
+                                max_pages=args.max_pages, force_full_sweep=args.full_sweep,
+                                schedule=not args.all, max_searches=args.max_searches,
+                                log_formats=args.report_format or ('text',), email_format=args.email_format,
+                                send_email=not args.no_email, retention_days=args.retention)
+        if args.profile:
+            import cProfile
+            import pstats
+            from retrieval.stats import METRICS_FILE, PROFILE_FILE
+
+            profiler = cProfile.Profile()
+            profiler.runcall(retrieve_search_items, metrics_file=METRICS_FILE, **retrieve_options)
+            profiler.dump_stats(PROFILE_FILE)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+            print(f"Profile written to {PROFILE_FILE}, metrics to {METRICS_FILE}")
+        else:
+            retrieve_search_items(**retrieve_options)
         exit()
 
+    from gui.gui import main_window
+
     main_window()
 
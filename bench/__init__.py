@@ -0,0 +1,4 @@
+# bench/__init__.py
+#
+# The benchmarks run as scripts (python bench/replay.py ...); this only makes
+# harness.py importable from the tests as bench.harness.
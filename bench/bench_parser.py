@@ -0,0 +1,97 @@
+# bench/bench_parser.py
+#
+# Compares retrieval.parser against the old BeautifulSoup extraction on the
+# saved result pages in bench/fixtures and reports rows per second.
+#
+# Usage (from the repository root):
+#   python bench/bench_parser.py [-n ROUNDS]
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval.parser import parse_result_table
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def parse_with_beautifulsoup(html):
+    # The extraction get_url_data used before retrieval.parser existed
+    from bs4 import BeautifulSoup
+
+    data = []
+    soup = BeautifulSoup(html, 'html.parser')
+    search_table = soup.find('table', {'class': 'border text-left border-black my-2 w-full table-fixed result-table'})
+    if not search_table:
+        return None
+    rows = search_table.find_all('tr')
+    for row in rows[1:]:  # Skip the header row
+        columns = row.find_all('td')
+        anchor_tag = columns[2].find('a')
+        title = anchor_tag.text.strip()
+        flex_row_div = columns[2].find('div', {'class': 'flex-row'})
+        size = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border bg-white'}).text.strip()
+        parts_span = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border complete bg-gray-100'})
+        parts = parts_span.text.strip() if parts_span else ''
+        email = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border bg-blue-100'}).text.strip()
+        groups = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border bg-gray-100'}).text.strip()
+        data.append([columns[0].text.strip(), columns[1].text.strip(), title, size, parts, email, groups,
+                     columns[3].text.strip()])
+    return data
+
+
+def time_parser(parse, pages, rounds):
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            result = parse(html)
+            rows += len(result) if result else 0
+    return rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Result-table parser benchmark")
+    parser.add_argument("-n", "--rounds", type=int, default=20, help="Passes over the fixtures")
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as html_file:
+            pages[os.path.basename(path)] = html_file.read()
+
+    try:
+        import bs4  # noqa: F401
+        have_bs4 = True
+    except ImportError:
+        have_bs4 = False
+        print("beautifulsoup4 not installed, skipping the baseline")
+
+    # Both parsers must agree before the numbers mean anything
+    if have_bs4:
+        for name, html in pages.items():
+            new = parse_result_table(html)
+            old = parse_with_beautifulsoup(html)
+            new = [list(row) for row in new] if new is not None else None
+            if new != old:
+                sys.exit(f"{name}: parsers disagree")
+
+    html = list(pages.values())
+    results = [("retrieval.parser", time_parser(parse_result_table, html, args.rounds))]
+    if have_bs4:
+        results.append(("BeautifulSoup", time_parser(parse_with_beautifulsoup, html, args.rounds)))
+
+    print("{:<20} {:>10} {:>10} {:>14}".format("Parser", "Rows", "Seconds", "Rows/sec"))
+    for name, (rows, seconds) in results:
+        print("{:<20} {:>10} {:>10.3f} {:>14,.0f}".format(name, rows, seconds, rows / seconds))
+    if have_bs4:
+        speedup = results[1][1][1] / results[0][1][1]
+        print(f"Speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
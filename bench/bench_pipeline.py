@@ -0,0 +1,207 @@
+# bench/bench_pipeline.py
+#
+# End-to-end benchmark of the retrieval pipeline on synthetic data, fully
+# offline: fetch -> parse -> diff -> persist -> report. Each stage is timed
+# on its own and reports its throughput; with --memory also its peak traced
+# memory (tracemalloc slows the parser down many times over, so timings
+# from a --memory run are only comparable with each other). The process's
+# peak RSS is always printed.
+#
+#   fetch    every search's pages from a local HTTP server through
+#            polite_get, on a thread pool (bodies discarded)
+#   parse    the result pages through the streaming parser and filter
+#   diff     reconcile_rows' in-memory key comparison
+#   persist  its FoundList writes, on a scratch WAL database
+#   report   text, html and jsonl report sections for every search
+#
+# Usage (from the repository root):
+#   python bench/bench_pipeline.py [--searches 10] [--rows 100] [--pages 1] [--memory]
+#
+# Suggested grid: --searches 10 / 1000 / 10000 with --rows 100 to 5000.
+# The small default finishes in seconds and exits non-zero if the stages
+# disagree, so it can run headless in CI; --json appends the results for
+# tracking regressions.
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.database_operations import (DATABASE, db_create_db, db_connect, db_add_search_strings,
+                                    db_get_search_entries, db_get_filter_rules)
+from retrieval import HostRateLimiter, polite_get, make_session, get_url, compile_filters, SearchStats
+from retrieval.retrieval import parse_page, reconcile_rows
+from retrieval.report import RunReport
+from harness import LocalHTTPServer, LocalSession, synthetic_page, page_etag
+
+# Distinct synthetic pages kept in memory; searches share them round-robin
+PAGE_VARIANTS = 8
+
+
+class Stage:
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.peak = 0
+
+    def result(self):
+        return {'stage': self.name, 'unit': self.unit, 'items': self.items, 'bytes': self.bytes,
+                'seconds': self.seconds, 'per_second': self.items / self.seconds if self.seconds else 0.0,
+                'peak_mb': self.peak / 1024 / 1024}
+
+
+def measure(stage, trace, function, *args, **kwargs):
+    # Run one unit of a stage, adding its time and peak memory to the stage
+    if trace:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    stage.seconds += time.perf_counter() - start
+    if trace:
+        stage.peak = max(stage.peak, tracemalloc.get_traced_memory()[1] - base)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval pipeline benchmark on synthetic data")
+    parser.add_argument("--searches", type=int, default=10, help="Search strings")
+    parser.add_argument("--rows", type=int, default=100, help="Rows per result page (100-5000)")
+    parser.add_argument("--pages", type=int, default=1, help="Result pages per search")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent fetches")
+    parser.add_argument("--memory", action="store_true", help="Trace each stage's peak memory (slows it down)")
+    parser.add_argument("--json", metavar="PATH", help="Append the results as one JSON line to PATH")
+    args = parser.parse_args()
+    trace = args.memory
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    print(f"Generating {PAGE_VARIANTS} page(s) of {args.rows} rows...")
+    variants = []
+    for seed in range(PAGE_VARIANTS):
+        body = synthetic_page(f"variant {seed}", args.rows, seed)
+        variants.append((200, page_etag(body), None, body))
+
+    search_strings = [f"synthetic search {number}" for number in range(args.searches)]
+    page_of = {}  # request path -> variant, for every search's pages
+    for number, search_string in enumerate(search_strings):
+        for page in range(1, args.pages + 1):
+            path = get_url(search_string, page)[len('https://binsearch.info'):]
+            page_of[path] = (number * args.pages + page) % PAGE_VARIANTS
+
+    stages = [Stage('fetch', 'pages'), Stage('parse', 'rows'), Stage('diff', 'rows'),
+              Stage('persist', 'rows'), Stage('report', 'rows')]
+    fetch, parse, diff, persist, report_stage = stages
+
+    work_dir = tempfile.mkdtemp(prefix='booksearch-bench-')
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    failed = []
+    if trace:
+        tracemalloc.start()
+    try:
+        os.makedirs('bin')
+        db_create_db(DATABASE)
+        conn = db_connect(DATABASE)
+        db_add_search_strings(conn, search_strings)
+        search_ids = {entry[1]: entry[0] for entry in db_get_search_entries(conn)}
+        row_filter = compile_filters(db_get_filter_rules(conn))[None]
+
+        with LocalHTTPServer(lambda path: variants[page_of[path]] if path in page_of else None) as http_server:
+            # Fetch: the whole run's pages, concurrently
+            limiter = HostRateLimiter(rate=100000.0, burst=args.workers, jitter=0)
+            session = LocalSession(make_session(args.workers), http_server.url)
+
+            def fetch_page(url):
+                return len(polite_get(url, limiter, session=session).content)
+
+            def fetch_all():
+                urls = [get_url(search_string, page) for search_string in search_strings
+                        for page in range(1, args.pages + 1)]
+                with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                    return list(executor.map(fetch_page, urls))
+
+            sizes = measure(fetch, trace, fetch_all)
+            session.close()
+            fetch.items = len(sizes)
+            fetch.bytes = sum(sizes)
+            if http_server.requests != fetch.items:
+                failed.append(f"fetch: {http_server.requests} requests for {fetch.items} pages")
+
+        # Parse, diff, persist and report, one search at a time
+        report = RunReport("benchmark", ('text', 'html', 'jsonl'), 'text')
+        try:
+            for number, search_string in enumerate(search_strings):
+                rows = []
+                for page in range(1, args.pages + 1):
+                    html = variants[(number * args.pages + page) % PAGE_VARIANTS][3].decode('utf-8')
+                    page_rows, row_count = measure(parse, trace, parse_page, html, row_filter)
+                    parse.items += row_count
+                    parse.bytes += len(html)
+                    rows.extend(page_rows)
+
+                stats = SearchStats(search_ids[search_string], search_string)
+                # Every row is new to the scratch database: nothing to load
+                # or delete, so diff + persist is the insert-heavy case
+                delta_list, _ = measure(diff, trace, reconcile_rows, conn, stats.search_id, rows,
+                                        delete_missing=False, db_items=[], stats=stats)
+                diff.seconds -= stats.db_seconds  # the writes are persist's share
+                persist.seconds += stats.db_seconds
+                diff.items += len(rows)
+                persist.items += len(delta_list)
+                persist.peak = diff.peak  # traced together with diff
+
+                measure(report_stage, trace, report.add, search_string, delta_list)
+                report_stage.items += len(delta_list)
+        finally:
+            report.close()
+        report_stage.bytes = sum(os.path.getsize(path) for path in
+                                 ('output_log.txt', 'output_log.html', 'output_log.jsonl'))
+
+        stored = conn.execute("SELECT COUNT(*) FROM FoundList").fetchone()[0]
+        if stored != persist.items:
+            failed.append(f"persist: {persist.items} rows added but {stored} stored")
+        if parse.items != args.searches * args.pages * args.rows:
+            failed.append(f"parse: {parse.items} rows parsed of {args.searches * args.pages * args.rows}")
+        conn.close()
+    finally:
+        if trace:
+            tracemalloc.stop()
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{args.searches} search(es) x {args.pages} page(s) x {args.rows} rows"
+          f"{' (memory traced)' if trace else ''}")
+    print("{:<8} {:>10} {:>6} {:>10} {:>14} {:>9} {:>9}".format(
+        "Stage", "Items", "Unit", "Seconds", "Items/sec", "MB/sec", "Peak MB"))
+    for stage in stages:
+        result = stage.result()
+        mb_per_second = stage.bytes / 1024 / 1024 / stage.seconds if stage.bytes and stage.seconds else 0.0
+        print("{:<8} {:>10} {:>6} {:>10.3f} {:>14,.0f} {:>9.1f} {:>9}".format(
+            stage.name, stage.items, stage.unit, stage.seconds, result['per_second'], mb_per_second,
+            f"{result['peak_mb']:.1f}" if trace else '-'))
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if json_path:
+        with open(json_path, 'a', encoding='utf-8') as json_file:
+            json_file.write(json.dumps({'timestamp': int(time.time()), 'searches': args.searches,
+                                        'rows': args.rows, 'pages': args.pages, 'memory_traced': trace,
+                                        'stages': [stage.result() for stage in stages]}) + "\n")
+
+    if failed:
+        sys.exit("\n".join(failed))
+
+
+if __name__ == "__main__":
+    main()
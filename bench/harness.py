@@ -0,0 +1,193 @@
+# bench/harness.py
+#
+# Local stand-ins for the two services retrieval talks to, so the pipeline
+# can run offline (replay.py, bench_pipeline.py):
+#
+#   LocalHTTPServer  serves result pages from memory on 127.0.0.1, with
+#                    ETag / If-None-Match support
+#   SMTPStub         accepts mail on 127.0.0.1 and keeps the messages
+#   LocalSession     a requests session that sends binsearch.info URLs to
+#                    the local server instead
+#
+# plus synthetic result pages in binsearch's table layout.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import random
+import socketserver
+import threading
+
+SITE_ORIGIN = 'https://binsearch.info'
+
+
+class LocalHTTPServer:
+    # pages: callable taking the request path ('/?q=...') and returning
+    # (status, etag, last_modified, body bytes), or None for a 404
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real site
+
+            def do_GET(self):
+                server.requests += 1
+                page = server.pages(self.path)
+                if page is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status, etag, last_modified, body = page
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                if last_modified:
+                    self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SMTPStub:
+    # Just enough SMTP for smtplib.sendmail without STARTTLS or AUTH; call
+    # send_outbox(conn, host, port, starttls=False, password='')
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b"\r\n")
+
+            def handle(self):
+                stub.connections += 1
+                self.reply("220 localhost SMTP stub")
+                for raw in self.rfile:
+                    command = raw.decode('utf-8', 'replace').strip().split(' ', 1)[0].upper()
+                    if command in ('EHLO', 'HELO'):
+                        self.reply("250 localhost")
+                    elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                        self.reply("250 OK")
+                    elif command == 'DATA':
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for data in self.rfile:
+                            if data in (b".\r\n", b".\n"):
+                                break
+                            lines.append(data[1:] if data.startswith(b"..") else data)
+                        stub.messages.append(b"".join(lines))
+                        self.reply("250 OK")
+                    elif command == 'QUIT':
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalSession:
+    # Wraps a pooled session (retrieval.make_session) and rewrites the site
+    # origin to a local server; everything else is passed through
+    def __init__(self, session, target, origin=SITE_ORIGIN):
+        self.session = session
+        self.target = target
+        self.origin = origin
+
+    def get(self, url, **kwargs):
+        if url.startswith(self.origin):
+            url = self.target + url[len(self.origin):]
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def page_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+# Synthetic result pages
+
+AUTHORS = ['Piers Anthony', 'Lawrence Block', 'Ursula K. Le Guin', 'Terry Pratchett', 'Margaret Atwood',
+           'Dan Brown', 'Iain M. Banks', 'Octavia E. Butler', 'Neal Stephenson', 'Robin Hobb']
+TITLES = ['Inferno', 'Shannara', 'Earthsea', 'The Testaments', 'Xanth', 'Discworld', 'Culture',
+          'Kindred', 'Anathem', 'Assassin']
+POSTERS = ['poster@usenet.org (Poster)', 'yenc@power-post.org (YEnc)', 'Anonymous <nobody@example.com>']
+GROUPS = ['alt.binaries.ebook', 'alt.binaries.e-book.technical', 'alt.binaries.e-book', 'alt.binaries.german']
+AGES = ['5m', '3h', '1d', '3d', '12d', '45d', '2mo', '1y', '700d']
+
+
+def synthetic_page(title, rows, seed):
+    # A binsearch result page with `rows` rows; the same seed gives the
+    # same page. Some rows are posted to a german group so the default
+    # filter rule has something to drop.
+    rng = random.Random(seed)
+    parts = [
+        '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n',
+        f'<title>BinSearch - {title}</title>\n</head>\n<body class="bg-gray-50">\n',
+        '<table class="border text-left border-black my-2 w-full table-fixed result-table">\n',
+        '<tr class="bg-gray-200"><th class="w-8"></th><th class="w-12">#</th><th>Subject</th>'
+        '<th class="w-20">Age</th></tr>\n',
+    ]
+    for index in range(1, rows + 1):
+        total = rng.randint(1, 60)
+        subject = (f'&quot;{rng.choice(AUTHORS)} - {rng.choice(TITLES)} {seed}-{index}.epub&quot; '
+                   f'yEnc (1/{total}) {rng.randint(100, 9999)}K')
+        complete = (f'<span class="rounded-lg px-2 border-gray-300 border complete bg-gray-100">'
+                    f'{total} / {total} parts</span>\n') if rng.random() < 0.7 else ''
+        parts.append(
+            f'<tr class="border-b">\n'
+            f'<td class="px-1"><input type="checkbox" name="{rng.randint(10 ** 9, 10 ** 10)}"></td>\n'
+            f'<td class="px-1">{index}</td>\n'
+            f'<td class="px-1 break-words"><a class="font-medium text-blue-700" '
+            f'href="/details/{rng.randint(10 ** 6, 10 ** 7)}">{subject}</a>\n'
+            f'<div class="flex flex-row flex-wrap gap-1 text-xs mt-1">\n'
+            f'<span class="rounded-lg px-2 border-gray-300 border bg-white">size: '
+            f'{rng.uniform(0.2, 90):.1f} MB</span>\n'
+            f'{complete}'
+            f'<span class="rounded-lg px-2 border-gray-300 border bg-blue-100">{rng.choice(POSTERS)}</span>\n'
+            f'<span class="rounded-lg px-2 border-gray-300 border bg-gray-100">{rng.choice(GROUPS)}</span>\n'
+            f'<a class="rounded-lg px-2 border-gray-300 border" href="/nzb?{index}">nzb</a>\n'
+            f'</div></td>\n'
+            f'<td class="px-1 text-right">{rng.choice(AGES)}</td>\n'
+            f'</tr>\n')
+    parts.append('</table>\n</body>\n</html>\n')
+    return ''.join(parts).encode('utf-8')
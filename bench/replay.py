@@ -0,0 +1,192 @@
+# bench/replay.py
+#
+# Record real binsearch responses once, then replay them offline.
+#
+#   python bench/replay.py record ARCHIVE [-s SEARCH ...] [--db bin/BookSearch.db]
+#       Full-sweep every search string (from --search, or the database's
+#       SearchList) against the live site on a scratch database, saving
+#       every response to ARCHIVE (gzip'd JSON lines, keyed by the get_url
+#       URL). Nothing is emailed and the real database is not touched.
+#
+#   python bench/replay.py replay ARCHIVE [--runs N] [--keep DIR]
+#       Serve ARCHIVE from a local HTTP server, run retrieve_search_items
+#       against it on a scratch database and deliver the digest to a local
+#       SMTP stub. Run 2+ exercises the ETag cache. Exits non-zero if any
+#       search failed, so it can gate CI.
+#
+# Run from the repository root.
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.database_operations import (DATABASE, db_create_db, db_connect, db_add_search_strings,
+                                    db_get_all_search_strings)
+from retrieval import make_session, retrieve_search_items, send_outbox
+from harness import LocalHTTPServer, SMTPStub, LocalSession, page_etag
+
+
+class RecordingSession:
+    # Passes requests through to the live site and keeps the last response
+    # for every URL
+    def __init__(self, session):
+        self.session = session
+        self.records = {}
+
+    def get(self, url, **kwargs):
+        response = self.session.get(url, **kwargs)
+        if response.status_code != 304:
+            self.records[url] = {
+                'url': url,
+                'status': response.status_code,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'body': response.text,
+            }
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def write_archive(path, search_strings, records):
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        archive.write(json.dumps({'search_strings': search_strings, 'recorded_at': int(time.time())}) + "\n")
+        for record in records:
+            archive.write(json.dumps(record) + "\n")
+
+
+def read_archive(path):
+    # Returns (search strings, {url: record})
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        header = json.loads(archive.readline())
+        records = {}
+        for line in archive:
+            record = json.loads(line)
+            records[record['url']] = record
+    return header['search_strings'], records
+
+
+def scratch_database(search_strings):
+    # Fresh database in the current (temporary) directory
+    os.makedirs('bin', exist_ok=True)
+    db_create_db(DATABASE)
+    conn = db_connect(DATABASE)
+    db_add_search_strings(conn, search_strings)
+    return conn
+
+
+def record(args):
+    archive_path = os.path.abspath(args.archive)
+    if args.search:
+        search_strings = args.search
+    else:
+        conn = db_connect(args.db)
+        search_strings = db_get_all_search_strings(conn)
+        conn.close()
+
+    work_dir = tempfile.mkdtemp(prefix='booksearch-record-')
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        conn = scratch_database(search_strings)
+        session = RecordingSession(make_session(args.workers))
+        try:
+            _, error_log = retrieve_search_items(workers=args.workers, rate=args.rate, use_cache=False,
+                                                 max_pages=args.max_pages, force_full_sweep=True,
+                                                 schedule=False, conn=conn, session=session, log_formats=(),
+                                                 send_email=False, digest=False)
+        finally:
+            session.close()
+            conn.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    write_archive(archive_path, search_strings, session.records.values())
+    for error in error_log:
+        print(error)
+    print(f"Recorded {len(session.records)} page(s) for {len(search_strings)} search string(s) to {args.archive}")
+
+
+def replay(args):
+    search_strings, records = read_archive(args.archive)
+    bodies = {}
+    for url, record in records.items():
+        parts = urlsplit(url)
+        body = record['body'].encode('utf-8')
+        bodies[parts.path + ('?' + parts.query if parts.query else '')] = (
+            record['status'], record['etag'] or page_etag(body), record['last_modified'], body)
+
+    work_dir = os.path.abspath(args.keep) if args.keep else tempfile.mkdtemp(prefix='booksearch-replay-')
+    os.makedirs(work_dir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    failed = False
+    try:
+        with LocalHTTPServer(bodies.get) as http_server, SMTPStub() as smtp:
+            conn = scratch_database(search_strings)
+            session = LocalSession(make_session(args.workers), http_server.url)
+            try:
+                for run in range(1, args.runs + 1):
+                    requests_before = http_server.requests
+                    start = time.perf_counter()
+                    master_dict, error_log = retrieve_search_items(
+                        workers=args.workers, rate=1000.0, burst=args.workers, jitter=0,
+                        max_pages=args.max_pages, schedule=False, conn=conn, session=session, send_email=False)
+                    sent, send_failed = send_outbox(conn, smtp.host, smtp.port, starttls=False, password='')
+                    seconds = time.perf_counter() - start
+                    added = sum(len(delta_list) for delta_list in master_dict.values())
+                    print(f"Run {run}: {len(search_strings)} search(es), "
+                          f"{http_server.requests - requests_before} request(s), {added} added, "
+                          f"{len(error_log)} error(s), {sent} email(s) in {seconds:.2f}s")
+                    for error in error_log:
+                        print(" ", error)
+                    failed = failed or bool(error_log) or bool(send_failed)
+            finally:
+                session.close()
+                conn.close()
+            print(f"SMTP stub received {len(smtp.messages)} message(s)")
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay binsearch responses")
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    parser_record = subparsers.add_parser('record', help="Capture live responses into an archive")
+    parser_record.add_argument('archive', help="Archive file to write (.jsonl.gz)")
+    parser_record.add_argument('-s', '--search', action='append', help="Search string to record (repeatable)")
+    parser_record.add_argument('--db', default=DATABASE, help="Database to take the search strings from")
+    parser_record.add_argument('-w', '--workers', type=int, default=4)
+    parser_record.add_argument('--rate', type=float, default=1.0, help="Max requests per second to the site")
+    parser_record.add_argument('--max-pages', type=int, default=20)
+    parser_record.set_defaults(handler=record)
+
+    parser_replay = subparsers.add_parser('replay', help="Run retrieval against an archive, offline")
+    parser_replay.add_argument('archive', help="Archive file to serve")
+    parser_replay.add_argument('--runs', type=int, default=2, help="Retrieval runs against the same database")
+    parser_replay.add_argument('--keep', metavar='DIR', help="Keep the scratch database and logs in DIR")
+    parser_replay.add_argument('-w', '--workers', type=int, default=4)
+    parser_replay.add_argument('--max-pages', type=int, default=20)
+    parser_replay.set_defaults(handler=replay)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# conftest.py
+#
+# Lets pytest import the top-level packages (db, retrieval, bench) when run
+# from the repository root, with "pytest" as well as "python -m pytest", and
+# holds the fixtures the tests share.
+
+import pytest
+
+from db.database_operations import db_create_db, db_connect
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    # A fresh database at the current schema version
+    path = str(tmp_path / 'test.db')
+    db_create_db(path)
+    return path
+
+
+@pytest.fixture
+def conn(database_path):
+    conn = db_connect(database_path)
+    yield conn
+    conn.close()
@@ -1,15 +1,91 @@
 # db/database_operations/__init__.py
 
 from .database_operations import (
+    DATABASE,
+    STATEMENT_CACHE,
+    db_set_path,
+    db_get_path,
+    db_connect,
     db_create_db,
     db_add_search_string,
+    db_add_search_strings,
+    db_iter_search_strings,
     db_check_search_string_exists,
     db_get_search_string_id,
     db_get_all_search_strings,
+    db_get_search_entries,
+    db_iter_search_entries,
+    db_get_search_generation,
+    db_get_list_generation,
+    db_set_full_sweep,
+    db_record_search_check,
     db_remove_item_list,
     db_remove_search_string,
     db_get_found_items,
+    db_iter_found_items,
+    db_get_found_item_keys,
+    db_iter_found_item_keys,
+    db_rekey_found_items,
+    db_search_found_items,
     db_add_found_item,
+    db_add_found_items,
     db_get_entry_count,
+    db_count_items_since,
+    db_prune_found_items,
+    db_get_response_cache,
+    db_set_response_cache,
+    db_get_filter_rules,
+    db_add_filter_rule,
+    db_remove_filter_rule,
+    db_add_notifications,
+    db_get_pending_notifications,
+    db_mark_notifications_sent,
+    db_mark_notifications_failed,
+    db_create_shard_run,
+    db_get_shard_run,
+    db_claim_leases,
+    db_renew_leases,
+    db_complete_leases,
+    db_count_pending_leases,
+    db_finish_shard_run,
+    db_iter_run_deltas,
+    db_add_run_history,
+    db_get_run_history,
+    db_get_slow_searches,
+    ITEM_EVENT_COLUMNS,
+    db_get_last_event_id,
+    db_iter_item_events,
+    db_get_export_checkpoint,
+    db_set_export_checkpoint,
 )
 
+
+from .repository import (
+    Database,
+)
+
+from .migrations import (
+    db_migrate,
+    db_get_schema_version,
+    SCHEMA_VERSION,
+)
+
+from .search_list_io import (
+    import_search_list,
+    export_search_list,
+)
+
+from .item_events_io import (
+    EVENT_FORMATS,
+    export_item_events,
+)
+
+from .normalize import (
+    item_key,
+    normalize_subject,
+)
+
+from .age import (
+    parse_age,
+    format_age,
+)
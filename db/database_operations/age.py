@@ -0,0 +1,54 @@
+# db/database_operations/age.py
+#
+# binsearch shows how old a post is ("3d", "5h", "2 months") relative to
+# when the page was fetched. FoundList keeps that text in Age, and the
+# absolute time it works out to in PostedAt (epoch seconds), which is what
+# sorting, "new this week" queries and retention pruning use.
+
+import re
+import time
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# Unit spellings -> seconds. A bare "m" is minutes, as on binsearch; months
+# need "mo"/"mon"/"month".
+AGE_UNITS = {
+    's': 1, 'sec': 1, 'secs': 1, 'second': 1, 'seconds': 1,
+    'm': MINUTE, 'min': MINUTE, 'mins': MINUTE, 'minute': MINUTE, 'minutes': MINUTE,
+    'h': HOUR, 'hr': HOUR, 'hrs': HOUR, 'hour': HOUR, 'hours': HOUR,
+    'd': DAY, 'day': DAY, 'days': DAY,
+    'w': 7 * DAY, 'wk': 7 * DAY, 'week': 7 * DAY, 'weeks': 7 * DAY,
+    'mo': 30 * DAY, 'mon': 30 * DAY, 'month': 30 * DAY, 'months': 30 * DAY,
+    'y': 365 * DAY, 'yr': 365 * DAY, 'year': 365 * DAY, 'years': 365 * DAY,
+}
+
+AGE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-z]+)\s*$', re.IGNORECASE)
+
+
+def parse_age(age, now=None):
+    # Epoch seconds the post was made, or None if the text isn't an age
+    match = AGE_PATTERN.match(age or '')
+    if not match:
+        return None
+    unit = AGE_UNITS.get(match.group(2).lower())
+    if unit is None:
+        return None
+    if now is None:
+        now = time.time()
+    return int(now - float(match.group(1)) * unit)
+
+
+def format_age(posted_at, now=None):
+    # Age text in binsearch's short style, as of now
+    if now is None:
+        now = time.time()
+    seconds = max(0, int(now - posted_at))
+    if seconds >= 365 * DAY:
+        return f"{seconds // (365 * DAY)}y"
+    if seconds >= DAY:
+        return f"{seconds // DAY}d"
+    if seconds >= HOUR:
+        return f"{seconds // HOUR}h"
+    return f"{seconds // MINUTE}m"
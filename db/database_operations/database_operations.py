@@ -1,48 +1,85 @@
 # db/database_operations.py
 
+import json
+import os
 import sqlite3
+import time
+
+from .migrations import db_migrate, rekey_found_items
+from .normalize import item_key
+from .age import parse_age
 
 DATABASE = 'bin/BookSearch.db'
 
-def db_create_db():
-    # Connect to the SQLite database (or create one if it doesn't exist)
-    conn = sqlite3.connect(DATABASE)
+# Database used when no path is given: BOOKSEARCH_DB, or --db on the
+# command line (db_set_path), else DATABASE
+database_path = os.environ.get('BOOKSEARCH_DB') or DATABASE
 
-    # Create a cursor object to execute SQL commands
-    cursor = conn.cursor()
+# Prepared statements kept per connection. The sqlite3 module reuses a
+# statement whenever the same SQL text runs again; the db_ functions use
+# fixed SQL, so this only needs to hold all of them.
+STATEMENT_CACHE = 256
 
-    # Create the 'SearchList' table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS SearchList (
-            id INTEGER PRIMARY KEY,
-            search_string TEXT UNIQUE
-        )
-    ''')
+def db_set_path(path):
+    global database_path
+    database_path = path
 
-    # Create the 'FoundList' table with columns from the DataFrame
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS FoundList (
-            id INTEGER PRIMARY KEY,
-            search_id INTEGER,
-            ItemIndex INTEGER,
-            Subject TEXT,
-            Poster TEXT,
-            ItemGroup TEXT,
-            Age TEXT,
-            FOREIGN KEY (search_id) REFERENCES SearchList(id)
-        )
-    ''')
-
-    # Commit changes to the database
-    conn.commit()
+def db_get_path():
+    return database_path
+
+def db_connect(database=None, check_same_thread=True):
+    # Open a connection with the per-connection pragmas the app relies on:
+    # foreign keys (for ON DELETE CASCADE), a busy timeout so a reader and
+    # a retrieval run can share the WAL database, and a larger page cache.
+    conn = sqlite3.connect(database or database_path, timeout=30, cached_statements=STATEMENT_CACHE,
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -16000")  # ~16 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+def db_create_db(database=None):
+    # Connect to the SQLite database (or create one if it doesn't exist)
+    conn = db_connect(database)
+
+    # WAL lets the GUI keep reading while a retrieval run is writing. The
+    # journal mode is stored in the database file, so this only needs
+    # setting once, here.
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    # Create the tables, or upgrade an existing database in place
+    db_migrate(conn)
     conn.close()
 
+def bump_search_generation(cursor, search_id):
+    # A search's found items changed; called inside the writing transaction
+    cursor.execute("UPDATE SearchList SET generation = generation + 1 WHERE id=?", (search_id,))
+
+def bump_list_generation(cursor):
+    # The search list itself changed
+    cursor.execute("UPDATE WriteGenerations SET generation = generation + 1 WHERE scope='SearchList'")
+
+def db_get_search_generation(conn, search_string):
+    # Returns (search_id, generation), or None if there is no such search
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, generation FROM SearchList WHERE search_string=?", (search_string,))
+    return cursor.fetchone()
+
+def db_get_list_generation(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT generation FROM WriteGenerations WHERE scope='SearchList'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
 def db_add_search_string(conn, search_string):
     # Example usage:
     # add_search_string(conn, "Piers Anthony epub")
     cursor = conn.cursor()
     try:
         cursor.execute("INSERT OR IGNORE INTO SearchList (search_string) VALUES (?)", (search_string,))
+        if cursor.rowcount:
+            bump_list_generation(cursor)
         conn.commit()
         return True  # Successfully added the search string
     except sqlite3.Error as e:
@@ -51,6 +88,50 @@ def db_add_search_string(conn, search_string):
         return False  # Failed to add the search string
 
 
+def db_add_search_strings(conn, search_strings, batch_size=10000):
+    # Bulk add from any iterable (consumed lazily), batch_size rows per
+    # transaction. Existing strings are skipped by INSERT OR IGNORE.
+    # Returns (added, duplicates).
+    added = 0
+    total = 0
+    cursor = conn.cursor()
+    try:
+        batch = []
+        for search_string in search_strings:
+            batch.append((search_string,))
+            if len(batch) >= batch_size:
+                cursor.executemany("INSERT OR IGNORE INTO SearchList (search_string) VALUES (?)", batch)
+                inserted = cursor.rowcount
+                if inserted:
+                    bump_list_generation(cursor)
+                conn.commit()
+                added += inserted
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany("INSERT OR IGNORE INTO SearchList (search_string) VALUES (?)", batch)
+            inserted = cursor.rowcount
+            if inserted:
+                bump_list_generation(cursor)
+            conn.commit()
+            added += inserted
+            total += len(batch)
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+    finally:
+        cursor.close()
+    return added, total - added
+
+
+def db_iter_search_strings(conn):
+    # Like db_get_all_search_strings, without building the whole list
+    cursor = conn.cursor()
+    cursor.execute("SELECT search_string FROM SearchList ORDER BY id")
+    for row in cursor:
+        yield row[0]
+
+
 def db_check_search_string_exists(conn, search_string):
     # Example usage:
     # exists = check_search_string_exists(conn, "Piers Anthony epub")
@@ -73,18 +154,62 @@ def db_get_search_string_id(conn, search_string):
 def db_get_all_search_strings(conn):
     cursor = conn.cursor()
     cursor.execute("SELECT search_string FROM SearchList")
-    search_strings = [row[0] for row in cursor.fetchall()]
+    search_strings = [row[0] for row in cursor]
     return search_strings
 
+def db_iter_search_entries(conn):
+    # Yields (id, search_string, last_full_sweep, last_checked,
+    # last_changed, change_rate) for every search string
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, search_string, last_full_sweep, last_checked, last_changed, change_rate FROM SearchList")
+    for row in cursor:
+        yield row
+
+def db_get_search_entries(conn):
+    return list(db_iter_search_entries(conn))
+
+def db_record_search_check(conn, search_id, timestamp, changed, change_rate):
+    # Store the outcome of checking one search string
+    cursor = conn.cursor()
+    try:
+        if changed:
+            cursor.execute("UPDATE SearchList SET last_checked=?, last_changed=?, change_rate=? WHERE id=?",
+                           (timestamp, timestamp, change_rate, search_id))
+        else:
+            cursor.execute("UPDATE SearchList SET last_checked=?, change_rate=? WHERE id=?",
+                           (timestamp, change_rate, search_id))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+def db_set_full_sweep(conn, search_id, timestamp):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE SearchList SET last_full_sweep=? WHERE id=?", (timestamp, search_id))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
 def db_remove_item_list(conn, search_id, item_ids_to_delete):
+    # Bulk delete: every id goes in a single transaction (one commit)
+    cursor = conn.cursor()
     try:
-        cursor = conn.cursor()
-        for item_id in item_ids_to_delete:
-            cursor.execute("DELETE FROM FoundList WHERE search_id = ? AND id = ?", (search_id, item_id))
-            conn.commit()
+        cursor.executemany("DELETE FROM FoundList WHERE search_id = ? AND id = ?",
+                           ((search_id, item_id) for item_id in item_ids_to_delete))
+        if cursor.rowcount:
+            bump_search_generation(cursor, search_id)
+        conn.commit()
+        return True
     except sqlite3.Error as e:
         print(f"Error deleting items: {e}")
         conn.rollback()  # Rollback changes in case of an error
+        return False
     finally:
         cursor.close()
 
@@ -103,6 +228,7 @@ def db_remove_search_string(conn, search_string):
             
             # Delete associated items from FoundList
             cursor.execute("DELETE FROM FoundList WHERE search_id=?", (search_id,))
+            bump_list_generation(cursor)
             
             conn.commit()
             return True  # Successfully removed the search string and associated items
@@ -114,19 +240,88 @@ def db_remove_search_string(conn, search_string):
         return False  # Failed to remove the search string
 
 
-def db_get_found_items(conn, search_id):
+def db_iter_found_items(conn, search_id):
+    # Newest first; items whose age couldn't be parsed come last
     cursor = conn.cursor()
-    query = "SELECT * FROM FoundList WHERE search_id=?"
+    query = ("SELECT id, search_id, ItemIndex, Subject, Poster, ItemGroup, Age, PostedAt FROM FoundList "
+             "WHERE search_id=? ORDER BY PostedAt IS NULL, PostedAt DESC")
     cursor.execute(query, (search_id,))
-    return cursor.fetchall()
+    for row in cursor:
+        yield row
+
+
+def db_get_found_items(conn, search_id):
+    return list(db_iter_found_items(conn, search_id))
+
+
+def db_iter_found_item_keys(conn, search_id):
+    # Yields (id, ItemKey) for a search's items; all the diff needs
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, ItemKey FROM FoundList WHERE search_id=?", (search_id,))
+    for row in cursor:
+        yield row
+
+
+def db_get_found_item_keys(conn, search_id):
+    return list(db_iter_found_item_keys(conn, search_id))
+
+
+def db_rekey_found_items(conn):
+    # Recompute every ItemKey, e.g. after changing the normalization rules
+    cursor = conn.cursor()
+    try:
+        rekey_found_items(cursor)
+        cursor.execute("UPDATE SearchList SET generation = generation + 1")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def fts_query(text):
+    # Turn free text into an FTS5 query: every word must match, the last one
+    # as a prefix. Words are quoted so punctuation can't break the syntax.
+    words = text.split()
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def db_search_found_items(conn, query, limit=100):
+    # Full-text search across every search string's found items, best
+    # matches first. Rows have the same columns as db_get_found_items.
+    match = fts_query(query)
+    if match is None:
+        return []
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT f.id, f.search_id, f.ItemIndex, f.Subject, f.Poster, f.ItemGroup, f.Age, f.PostedAt
+            FROM FoundSearch
+            JOIN FoundList f ON f.id = FoundSearch.rowid
+            WHERE FoundSearch MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (match, limit))
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print("Error:", e)
+        return []
 
 
 def db_add_found_item(conn, search_id, item_index, subject, poster, item_group, age):
     cursor = conn.cursor()
     try:
         cursor.execute(
-            "INSERT INTO FoundList (search_id, ItemIndex, Subject, Poster, ItemGroup, Age) VALUES (?, ?, ?, ?, ?, ?)",
-            (search_id, item_index, subject, poster, item_group, age))
+            "INSERT OR IGNORE INTO FoundList (search_id, ItemIndex, Subject, Poster, ItemGroup, Age, ItemKey, PostedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (search_id, item_index, subject, poster, item_group, age, item_key(subject, poster, item_group),
+             parse_age(age)))
+        if cursor.rowcount:
+            bump_search_generation(cursor, search_id)
         conn.commit()
         return True  # Successfully added the found item
     except sqlite3.Error as e:
@@ -135,6 +330,54 @@ def db_add_found_item(conn, search_id, item_index, subject, poster, item_group,
         return False  # Failed to add the found item
 
 
+def db_add_found_items(conn, search_id, items):
+    # Bulk insert: items is an iterable of
+    # (item_index, subject, poster, item_group, age) tuples, all written in
+    # a single transaction (one commit)
+    cursor = conn.cursor()
+    now = time.time()
+    try:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO FoundList (search_id, ItemIndex, Subject, Poster, ItemGroup, Age, ItemKey, PostedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((search_id,) + tuple(item) + (item_key(*item[1:4]), parse_age(item[4], now)) for item in items))
+        if cursor.rowcount:
+            bump_search_generation(cursor, search_id)
+        conn.commit()
+        return True  # Successfully added the found items
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False  # Failed to add the found items
+    finally:
+        cursor.close()
+
+
+def db_count_items_since(conn, posted_after):
+    # Items posted after the given epoch time, e.g. "new this week";
+    # answered from idx_foundlist_posted alone
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM FoundList WHERE PostedAt >= ?", (posted_after,))
+    return cursor.fetchone()[0]
+
+
+def db_prune_found_items(conn, posted_before):
+    # Retention: delete every item posted before the given epoch time in one
+    # statement. Items with an unparseable age are kept. Returns the number
+    # of items deleted, or None on error.
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE SearchList SET generation = generation + 1 "
+                       "WHERE id IN (SELECT DISTINCT search_id FROM FoundList WHERE PostedAt < ?)", (posted_before,))
+        cursor.execute("DELETE FROM FoundList WHERE PostedAt < ?", (posted_before,))
+        deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return None
+
+
 def db_get_entry_count(conn, search_id):
     # Example usage:
     # entry_count = get_entry_count(conn, 1)  # Replace 1 with the actual search_id
@@ -144,5 +387,315 @@ def db_get_entry_count(conn, search_id):
     return count
 
 
+def db_get_response_cache(conn):
+    # Returns {url: (etag, last_modified, content_hash)}
+    cursor = conn.cursor()
+    cursor.execute("SELECT url, etag, last_modified, content_hash FROM ResponseCache")
+    return {row[0]: row[1:] for row in cursor}
+
+
+def db_set_response_cache(conn, url, etag, last_modified, content_hash):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT OR REPLACE INTO ResponseCache (url, etag, last_modified, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (url, etag, last_modified, content_hash, int(time.time())))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_get_filter_rules(conn):
+    # Returns (id, search_id, field, action, pattern) of every filter rule;
+    # search_id is None for global rules
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, search_id, field, action, pattern FROM FilterRules ORDER BY id")
+    return cursor.fetchall()
+
+
+def db_add_filter_rule(conn, search_id, field, action, pattern):
+    # Cached pages were parsed under the old rules, so the response cache is
+    # cleared in the same transaction to make the next run re-parse them
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO FilterRules (search_id, field, action, pattern) VALUES (?, ?, ?, ?)",
+                       (search_id, field, action, pattern))
+        cursor.execute("DELETE FROM ResponseCache")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_remove_filter_rule(conn, rule_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM FilterRules WHERE id=?", (rule_id,))
+        cursor.execute("DELETE FROM ResponseCache")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_add_notifications(conn, notifications):
+    # notifications: iterable of (created_at, subject, body, subtype)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("INSERT INTO Outbox (created_at, subject, body, subtype) VALUES (?, ?, ?, ?)",
+                           notifications)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_get_pending_notifications(conn, now):
+    # Returns (id, subject, body, subtype, attempts) of unsent notifications
+    # that are due, oldest first
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, subject, body, subtype, attempts FROM Outbox "
+                   "WHERE sent_at IS NULL AND next_attempt <= ? ORDER BY id", (now,))
+    return cursor.fetchall()
+
+
+def db_mark_notifications_sent(conn, notification_ids, sent_at):
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("UPDATE Outbox SET sent_at=?, last_error=NULL WHERE id=?",
+                           ((sent_at, notification_id) for notification_id in notification_ids))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_mark_notifications_failed(conn, notification_ids, error, next_attempt):
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("UPDATE Outbox SET attempts=attempts+1, last_error=?, next_attempt=? WHERE id=?",
+                           ((error, next_attempt, notification_id) for notification_id in notification_ids))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_create_shard_run(conn, run_id, timestamp, search_ids):
+    # Start a sharded run with search_ids (in order) as its work list.
+    # Returns False if the run already exists (another worker created it).
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("INSERT OR IGNORE INTO ShardRuns (run_id, timestamp, created_at) VALUES (?, ?, ?)",
+                       (run_id, timestamp, int(time.time())))
+        created = cursor.rowcount == 1
+        if created:
+            cursor.executemany("INSERT INTO SearchLeases (run_id, search_id, position) VALUES (?, ?, ?)",
+                               ((run_id, search_id, position) for position, search_id in enumerate(search_ids)))
+        conn.commit()
+        return created
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_get_shard_run(conn, run_id):
+    # Returns (timestamp, finished_at), or None if there is no such run
+    cursor = conn.cursor()
+    cursor.execute("SELECT timestamp, finished_at FROM ShardRuns WHERE run_id=?", (run_id,))
+    return cursor.fetchone()
+
+
+def db_claim_leases(conn, run_id, worker, batch_size, expires_at, now):
+    # Atomically claim up to batch_size searches of the run that are neither
+    # done nor leased (a lease that expired belonged to a crashed worker).
+    # Returns the claimed search ids in work-list order.
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            UPDATE SearchLeases SET worker=?, expires_at=?
+            WHERE run_id=? AND search_id IN (
+                SELECT search_id FROM SearchLeases
+                WHERE run_id=? AND done_at IS NULL AND expires_at < ?
+                ORDER BY position LIMIT ?)
+        ''', (worker, expires_at, run_id, run_id, now, batch_size))
+        cursor.execute("SELECT search_id FROM SearchLeases WHERE run_id=? AND worker=? AND expires_at=? "
+                       "AND done_at IS NULL ORDER BY position", (run_id, worker, expires_at))
+        search_ids = [row[0] for row in cursor]
+        conn.commit()
+        return search_ids
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return []
+
+
+def db_renew_leases(conn, run_id, worker, expires_at):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE SearchLeases SET expires_at=? WHERE run_id=? AND worker=? AND done_at IS NULL",
+                       (expires_at, run_id, worker))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_complete_leases(conn, run_id, worker, search_ids, run_deltas, now):
+    # Mark the worker's searches done and store their additions
+    # (run_deltas: {search_string: delta_list}) in one transaction
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("UPDATE SearchLeases SET done_at=? WHERE run_id=? AND search_id=? AND worker=?",
+                           ((now, run_id, search_id, worker) for search_id in search_ids))
+        cursor.executemany("INSERT INTO RunDeltas (run_id, search_string, deltas) VALUES (?, ?, ?)",
+                           ((run_id, search_string, json.dumps(delta_list))
+                            for search_string, delta_list in run_deltas.items()))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
+
+
+def db_count_pending_leases(conn, run_id):
+    # Searches of the run not done yet, leased or not
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM SearchLeases WHERE run_id=? AND done_at IS NULL", (run_id,))
+    return cursor.fetchone()[0]
+
 
+def db_finish_shard_run(conn, run_id, now):
+    # Returns True for exactly one caller: the worker that gets to write the
+    # run's report and digest
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE ShardRuns SET finished_at=? WHERE run_id=? AND finished_at IS NULL", (now, run_id))
+        finished = cursor.rowcount == 1
+        conn.commit()
+        return finished
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
 
+
+def db_iter_run_deltas(conn, run_id):
+    # Yields (search_string, delta_list) in the order they were stored
+    cursor = conn.cursor()
+    cursor.execute("SELECT search_string, deltas FROM RunDeltas WHERE run_id=? ORDER BY id", (run_id,))
+    for search_string, deltas in cursor:
+        yield search_string, json.loads(deltas)
+
+
+def db_add_run_history(conn, run, searches):
+    # run: the RunHistory columns after id, in table order; searches: the
+    # SearchRunStats columns after run_id, in table order. Returns the run id.
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO RunHistory (started_at, total_seconds, searches, pages, bytes, rows_parsed, added, deleted, "
+            "errors, fetch_seconds, parse_seconds, diff_seconds, db_seconds, email_seconds) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", run)
+        run_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO SearchRunStats (run_id, search_id, pages, bytes, rows_parsed, added, deleted, unchanged, "
+            "fetch_seconds, parse_seconds, diff_seconds, db_seconds, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((run_id,) + tuple(search) for search in searches))
+        conn.commit()
+        return run_id
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return None
+
+
+def db_get_run_history(conn, limit=10):
+    # Most recent runs first: (id, started_at, total_seconds, searches,
+    # pages, bytes, added, deleted, errors)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, started_at, total_seconds, searches, pages, bytes, added, deleted, errors "
+                   "FROM RunHistory ORDER BY id DESC LIMIT ?", (limit,))
+    return cursor.fetchall()
+
+
+def db_get_slow_searches(conn, since, limit=10):
+    # Searches by average time per check since `since`: (search_string,
+    # checks, average seconds, average fetch seconds, errors)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT SearchList.search_string, COUNT(*),
+               AVG(Stats.fetch_seconds + Stats.parse_seconds + Stats.diff_seconds + Stats.db_seconds),
+               AVG(Stats.fetch_seconds), COUNT(Stats.error)
+        FROM SearchRunStats AS Stats
+        JOIN RunHistory ON RunHistory.id = Stats.run_id
+        JOIN SearchList ON SearchList.id = Stats.search_id
+        WHERE RunHistory.started_at >= ?
+        GROUP BY Stats.search_id
+        ORDER BY 3 DESC
+        LIMIT ?
+    ''', (since, limit))
+    return cursor.fetchall()
+
+
+# ItemEvents columns, in export order
+ITEM_EVENT_COLUMNS = ('id', 'occurred_at', 'event', 'search_id', 'search_string', 'item_id', 'ItemKey',
+                      'ItemIndex', 'Subject', 'Poster', 'ItemGroup', 'Age', 'PostedAt')
+
+def db_get_last_event_id(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(id) FROM ItemEvents")
+    return cursor.fetchone()[0] or 0
+
+def db_iter_item_events(conn, after_id, through_id):
+    # Yields the events with after_id < id <= through_id, oldest first, as
+    # ITEM_EVENT_COLUMNS tuples. search_string is None once the search has
+    # been removed.
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT ItemEvents.id, occurred_at, event, search_id, search_string, item_id, ItemKey, ItemIndex, "
+        "Subject, Poster, ItemGroup, Age, PostedAt "
+        "FROM ItemEvents LEFT JOIN SearchList ON SearchList.id = ItemEvents.search_id "
+        "WHERE ItemEvents.id > ? AND ItemEvents.id <= ? ORDER BY ItemEvents.id", (after_id, through_id))
+    for row in cursor:
+        yield row
+
+def db_get_export_checkpoint(conn, name):
+    # Last event id exported to name, 0 if it has never been exported
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_event_id FROM ExportCheckpoints WHERE name=?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def db_set_export_checkpoint(conn, name, last_event_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT OR REPLACE INTO ExportCheckpoints (name, last_event_id, exported_at) VALUES (?, ?, ?)",
+            (name, last_event_id, int(time.time())))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print("Error:", e)
+        conn.rollback()
+        return False
@@ -0,0 +1,88 @@
+# db/database_operations/item_events_io.py
+#
+# Incremental export of the ItemEvents journal. Each export writes only the
+# events since the destination's checkpoint, as one new part file in the
+# destination directory:
+#
+#   item_events_<first id>-<last id>.jsonl     one JSON object per event
+#   item_events_<first id>-<last id>.parquet   columnar (needs pyarrow)
+#
+# so syncing a backup or an analytics store means copying the new parts.
+# Parts are written to a temp file and renamed before the checkpoint moves,
+# so an interrupted export is simply redone by the next one. Checkpoints
+# are kept in ExportCheckpoints under the directory's absolute path.
+
+import json
+import os
+
+from .database_operations import (ITEM_EVENT_COLUMNS, db_get_last_event_id, db_iter_item_events,
+                                  db_get_export_checkpoint, db_set_export_checkpoint)
+
+EVENT_FORMATS = ('jsonl', 'parquet')
+
+# Events per Parquet row group
+PARQUET_BATCH = 50000
+
+
+def write_jsonl(path, events):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as events_file:
+        for event in events:
+            events_file.write(json.dumps(dict(zip(ITEM_EVENT_COLUMNS, event))) + "\n")
+            count += 1
+    return count
+
+
+def write_parquet(path, events):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    string, integer = pa.string(), pa.int64()
+    schema = pa.schema([('id', integer), ('occurred_at', integer), ('event', string), ('search_id', integer),
+                        ('search_string', string), ('item_id', integer), ('ItemKey', string),
+                        ('ItemIndex', integer), ('Subject', string), ('Poster', string), ('ItemGroup', string),
+                        ('Age', string), ('PostedAt', integer)])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for event in events:
+            batch.append(event)
+            if len(batch) >= PARQUET_BATCH:
+                writer.write_table(pa.Table.from_pylist([dict(zip(ITEM_EVENT_COLUMNS, row)) for row in batch],
+                                                        schema))
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            writer.write_table(pa.Table.from_pylist([dict(zip(ITEM_EVENT_COLUMNS, row)) for row in batch], schema))
+            count += len(batch)
+    return count
+
+
+def export_item_events(conn, directory, event_format='jsonl'):
+    # Returns (events written, path of the new part), or (0, None) if there
+    # was nothing new
+    writer = {'jsonl': write_jsonl, 'parquet': write_parquet}[event_format]
+    name = os.path.abspath(directory)
+    after_id = db_get_export_checkpoint(conn, name)
+    # Fix the upper bound first so events committed during the export wait
+    # for the next one
+    through_id = db_get_last_event_id(conn)
+    if through_id <= after_id:
+        return 0, None
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"item_events_{after_id + 1}-{through_id}.{event_format}")
+    temp_file = path + '.tmp'
+    try:
+        count = writer(temp_file, db_iter_item_events(conn, after_id, through_id))
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    os.replace(temp_file, path)
+    if not db_set_export_checkpoint(conn, name, through_id):
+        raise RuntimeError(f"Exported events to {path} but could not save the checkpoint")
+    return count, path
@@ -0,0 +1,426 @@
+# db/database_operations/migrations.py
+#
+# Versioned schema upgrades. The schema version lives in PRAGMA user_version;
+# db_migrate() runs every migration above the stored version, in order, each
+# in its own transaction, so an existing bin/BookSearch.db upgrades in place.
+
+import sqlite3
+import time
+
+from .normalize import item_key
+from .age import parse_age
+
+
+def migrate_v1(cursor):
+    # Original schema
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS SearchList (
+            id INTEGER PRIMARY KEY,
+            search_string TEXT UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS FoundList (
+            id INTEGER PRIMARY KEY,
+            search_id INTEGER,
+            ItemIndex INTEGER,
+            Subject TEXT,
+            Poster TEXT,
+            ItemGroup TEXT,
+            Age TEXT,
+            FOREIGN KEY (search_id) REFERENCES SearchList(id)
+        )
+    ''')
+
+
+def migrate_v2(cursor):
+    # Rebuild FoundList with ON DELETE CASCADE (SQLite can't alter a foreign
+    # key in place). Orphaned rows and duplicate items are dropped on the way
+    # so the unique identity index can be built.
+    cursor.execute('''
+        CREATE TABLE FoundList_v2 (
+            id INTEGER PRIMARY KEY,
+            search_id INTEGER,
+            ItemIndex INTEGER,
+            Subject TEXT,
+            Poster TEXT,
+            ItemGroup TEXT,
+            Age TEXT,
+            FOREIGN KEY (search_id) REFERENCES SearchList(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO FoundList_v2 (id, search_id, ItemIndex, Subject, Poster, ItemGroup, Age)
+        SELECT id, search_id, ItemIndex, Subject, Poster, ItemGroup, Age
+        FROM FoundList
+        WHERE search_id IN (SELECT id FROM SearchList)
+          AND id IN (SELECT MIN(id) FROM FoundList
+                     GROUP BY search_id, Subject, Poster, ItemGroup)
+    ''')
+    cursor.execute("DROP TABLE FoundList")
+    cursor.execute("ALTER TABLE FoundList_v2 RENAME TO FoundList")
+
+    # search_id leads the identity index, so it also serves every
+    # "WHERE search_id=?" lookup; a separate search_id index would only
+    # duplicate it and slow down inserts. (Replaced by idx_foundlist_key
+    # in v8, which keeps search_id first.)
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_foundlist_item
+        ON FoundList (search_id, Subject, Poster, ItemGroup)
+    ''')
+
+
+def migrate_v3(cursor):
+    # Per-URL validators and body digest from the last fetch, so unchanged
+    # result pages can skip the parse and diff
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ResponseCache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            fetched_at INTEGER
+        )
+    ''')
+
+
+def migrate_v4(cursor):
+    # When each search last had a full (all pages, with deletions) sweep
+    cursor.execute("ALTER TABLE SearchList ADD COLUMN last_full_sweep INTEGER")
+
+
+def migrate_v5(cursor):
+    # Full-text index over every found item, kept in sync with FoundList by
+    # triggers (external content table, so the text isn't stored twice)
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS FoundSearch USING fts5(
+            Subject, Poster, ItemGroup,
+            content='FoundList', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS FoundList_ai AFTER INSERT ON FoundList BEGIN
+            INSERT INTO FoundSearch (rowid, Subject, Poster, ItemGroup)
+            VALUES (new.id, new.Subject, new.Poster, new.ItemGroup);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS FoundList_ad AFTER DELETE ON FoundList BEGIN
+            INSERT INTO FoundSearch (FoundSearch, rowid, Subject, Poster, ItemGroup)
+            VALUES ('delete', old.id, old.Subject, old.Poster, old.ItemGroup);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS FoundList_au AFTER UPDATE OF Subject, Poster, ItemGroup ON FoundList BEGIN
+            INSERT INTO FoundSearch (FoundSearch, rowid, Subject, Poster, ItemGroup)
+            VALUES ('delete', old.id, old.Subject, old.Poster, old.ItemGroup);
+            INSERT INTO FoundSearch (rowid, Subject, Poster, ItemGroup)
+            VALUES (new.id, new.Subject, new.Poster, new.ItemGroup);
+        END
+    ''')
+    # Index the rows that are already there
+    cursor.execute("INSERT INTO FoundSearch (FoundSearch) VALUES ('rebuild')")
+
+
+def migrate_v6(cursor):
+    # Per-search check history for the refresh scheduler
+    cursor.execute("ALTER TABLE SearchList ADD COLUMN last_checked INTEGER")
+    cursor.execute("ALTER TABLE SearchList ADD COLUMN last_changed INTEGER")
+    cursor.execute("ALTER TABLE SearchList ADD COLUMN change_rate REAL")
+
+
+def migrate_v7(cursor):
+    # Notification outbox: digests waiting to be emailed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Outbox (
+            id INTEGER PRIMARY KEY,
+            created_at INTEGER,
+            subject TEXT,
+            body TEXT,
+            subtype TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            sent_at INTEGER
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_pending ON Outbox (next_attempt) WHERE sent_at IS NULL")
+
+
+def rekey_found_items(cursor):
+    # (Re)compute ItemKey for every row and drop rows that now share a key
+    # with an older row of the same search (they were reposts). Works with
+    # the unique (search_id, ItemKey) index in place: the duplicates go
+    # first, and changed keys are cleared before they are set, so no update
+    # can collide with a key another row is about to give up.
+    cursor.execute("SELECT id, search_id, Subject, Poster, ItemGroup, ItemKey FROM FoundList ORDER BY id")
+    seen = set()
+    duplicates = []
+    changed = []
+    for item_id, search_id, subject, poster, item_group, old_key in cursor.fetchall():
+        key = item_key(subject, poster, item_group)
+        if (search_id, key) in seen:
+            duplicates.append((item_id,))
+            continue
+        seen.add((search_id, key))
+        if key != old_key:
+            changed.append((key, item_id))
+    cursor.executemany("DELETE FROM FoundList WHERE id=?", duplicates)
+    cursor.executemany("UPDATE FoundList SET ItemKey=NULL WHERE id=?", ((item_id,) for _, item_id in changed))
+    cursor.executemany("UPDATE FoundList SET ItemKey=? WHERE id=?", changed)
+
+
+def migrate_v8(cursor):
+    # Items are identified by a digest of their normalized subject, poster
+    # and group instead of the exact strings (see normalize.py)
+    cursor.execute("ALTER TABLE FoundList ADD COLUMN ItemKey TEXT")
+    cursor.execute("DROP INDEX IF EXISTS idx_foundlist_item")
+    rekey_found_items(cursor)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_foundlist_key ON FoundList (search_id, ItemKey)")
+
+
+def migrate_v9(cursor):
+    # Result filter rules, global (search_id NULL) or for one search string.
+    # Replaces the hardcoded german/dutch group filter, which becomes the
+    # first global rule.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS FilterRules (
+            id INTEGER PRIMARY KEY,
+            search_id INTEGER,
+            field TEXT NOT NULL CHECK (field IN ('subject', 'poster', 'group', 'size')),
+            action TEXT NOT NULL CHECK (action IN ('include', 'exclude')),
+            pattern TEXT NOT NULL,
+            FOREIGN KEY (search_id) REFERENCES SearchList(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute("INSERT INTO FilterRules (search_id, field, action, pattern) VALUES (NULL, 'group', 'exclude', 'german|dutch')")
+
+
+def migrate_v10(cursor):
+    # Sharded runs: several worker processes share one run's search list.
+    # ShardRuns has one row per run; SearchLeases is the run's work list,
+    # each search claimed by one worker until expires_at (0 = unclaimed) and
+    # marked done_at once applied; RunDeltas collects every worker's
+    # additions for the run's single report and digest.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ShardRuns (
+            run_id TEXT PRIMARY KEY,
+            timestamp TEXT,
+            created_at INTEGER,
+            finished_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS SearchLeases (
+            run_id TEXT,
+            search_id INTEGER,
+            position INTEGER,
+            worker TEXT,
+            expires_at INTEGER NOT NULL DEFAULT 0,
+            done_at INTEGER,
+            PRIMARY KEY (run_id, search_id),
+            FOREIGN KEY (run_id) REFERENCES ShardRuns(run_id) ON DELETE CASCADE,
+            FOREIGN KEY (search_id) REFERENCES SearchList(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS RunDeltas (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT,
+            search_string TEXT,
+            deltas TEXT,
+            FOREIGN KEY (run_id) REFERENCES ShardRuns(run_id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rundeltas_run ON RunDeltas (run_id)")
+
+
+def migrate_v11(cursor):
+    # Retrieval instrumentation: one RunHistory row per run with its totals
+    # and stage timings, one SearchRunStats row per search checked
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS RunHistory (
+            id INTEGER PRIMARY KEY,
+            started_at INTEGER,
+            total_seconds REAL,
+            searches INTEGER,
+            pages INTEGER,
+            bytes INTEGER,
+            rows_parsed INTEGER,
+            added INTEGER,
+            deleted INTEGER,
+            errors INTEGER,
+            fetch_seconds REAL,
+            parse_seconds REAL,
+            diff_seconds REAL,
+            db_seconds REAL,
+            email_seconds REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS SearchRunStats (
+            id INTEGER PRIMARY KEY,
+            run_id INTEGER,
+            search_id INTEGER,
+            pages INTEGER,
+            bytes INTEGER,
+            rows_parsed INTEGER,
+            added INTEGER,
+            deleted INTEGER,
+            unchanged INTEGER,
+            fetch_seconds REAL,
+            parse_seconds REAL,
+            diff_seconds REAL,
+            db_seconds REAL,
+            error TEXT,
+            FOREIGN KEY (run_id) REFERENCES RunHistory(id) ON DELETE CASCADE,
+            FOREIGN KEY (search_id) REFERENCES SearchList(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_searchrunstats_run ON SearchRunStats (run_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_searchrunstats_search ON SearchRunStats (search_id)")
+
+
+def migrate_v12(cursor):
+    # Absolute post time parsed from the relative Age text. The text was
+    # relative to when each row was inserted, which isn't recorded, so
+    # existing rows are dated as of the upgrade.
+    cursor.execute("ALTER TABLE FoundList ADD COLUMN PostedAt INTEGER")
+    now = time.time()
+    cursor.execute("SELECT id, Age FROM FoundList")
+    posted = [(parse_age(age, now), item_id) for item_id, age in cursor.fetchall()]
+    cursor.executemany("UPDATE FoundList SET PostedAt=? WHERE id=?", posted)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_foundlist_posted ON FoundList (PostedAt)")
+
+
+def migrate_v13(cursor):
+    # Write generations, so readers can tell whether cached data is stale
+    # with one small read: SearchList.generation counts changes to a
+    # search's found items, WriteGenerations 'SearchList' changes to the
+    # search list itself. The db_ write functions bump them.
+    cursor.execute("ALTER TABLE SearchList ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS WriteGenerations (
+            scope TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO WriteGenerations (scope, generation) VALUES ('SearchList', 0)")
+
+
+def migrate_v14(cursor):
+    # Append-only journal of every FoundList add and delete, written by
+    # triggers in the same transaction as the change. Rows keep the item's
+    # columns so deleted items survive here; search_id has no foreign key so
+    # events outlive their search. AUTOINCREMENT keeps ids increasing, which
+    # exports use as their checkpoint.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ItemEvents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            occurred_at INTEGER NOT NULL,
+            event TEXT NOT NULL CHECK (event IN ('add', 'delete')),
+            search_id INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            ItemKey TEXT,
+            ItemIndex INTEGER,
+            Subject TEXT,
+            Poster TEXT,
+            ItemGroup TEXT,
+            Age TEXT,
+            PostedAt INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS FoundList_event_ai AFTER INSERT ON FoundList BEGIN
+            INSERT INTO ItemEvents (occurred_at, event, search_id, item_id, ItemKey, ItemIndex, Subject, Poster,
+                                    ItemGroup, Age, PostedAt)
+            VALUES (CAST(strftime('%s', 'now') AS INTEGER), 'add', new.search_id, new.id, new.ItemKey,
+                    new.ItemIndex, new.Subject, new.Poster, new.ItemGroup, new.Age, new.PostedAt);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS FoundList_event_ad AFTER DELETE ON FoundList BEGIN
+            INSERT INTO ItemEvents (occurred_at, event, search_id, item_id, ItemKey, ItemIndex, Subject, Poster,
+                                    ItemGroup, Age, PostedAt)
+            VALUES (CAST(strftime('%s', 'now') AS INTEGER), 'delete', old.search_id, old.id, old.ItemKey,
+                    old.ItemIndex, old.Subject, old.Poster, old.ItemGroup, old.Age, old.PostedAt);
+        END
+    ''')
+    # Start the journal from what is already stored, so replaying it
+    # rebuilds FoundList
+    cursor.execute('''
+        INSERT INTO ItemEvents (occurred_at, event, search_id, item_id, ItemKey, ItemIndex, Subject, Poster,
+                                ItemGroup, Age, PostedAt)
+        SELECT CAST(strftime('%s', 'now') AS INTEGER), 'add', search_id, id, ItemKey, ItemIndex, Subject, Poster,
+               ItemGroup, Age, PostedAt
+        FROM FoundList ORDER BY id
+    ''')
+    # Last event each export destination has written
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ExportCheckpoints (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL,
+            exported_at INTEGER NOT NULL
+        )
+    ''')
+
+
+def migrate_v15(cursor):
+    # The default file-size rule no longer strips title text such as "40k"
+    # or a trailing single letter, so stored keys are recomputed to match
+    rekey_found_items(cursor)
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = [
+    migrate_v1,
+    migrate_v2,
+    migrate_v3,
+    migrate_v4,
+    migrate_v5,
+    migrate_v6,
+    migrate_v7,
+    migrate_v8,
+    migrate_v9,
+    migrate_v10,
+    migrate_v11,
+    migrate_v12,
+    migrate_v13,
+    migrate_v14,
+    migrate_v15,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def db_get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def db_migrate(conn):
+    # Foreign key enforcement must be off while tables are rebuilt, and the
+    # pragma can't be changed inside a transaction.
+    version = db_get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                MIGRATIONS[target - 1](cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+    return SCHEMA_VERSION
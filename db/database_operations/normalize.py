@@ -0,0 +1,89 @@
+# db/database_operations/normalize.py
+#
+# Canonical identity of a found item. Reposts of the same book come back
+# with different part counters, yEnc markers and file sizes in the subject,
+# so the subject is normalized before it goes into the key; otherwise every
+# repost looks like a delete plus an add.
+#
+# The rules are (regex, replacement) pairs applied in order to the
+# lower-cased subject. Put a JSON list of [pattern, replacement] pairs in
+# bin/normalize_rules.json to override them, then run
+# "BookSearch.py --rekey" so stored keys match the new rules. A file that
+# can't be read, or has a rule that doesn't compile, is reported and the
+# default rules are used instead.
+#
+# Examples with the default rules:
+#   '"Dan Brown - Inferno.epub" yEnc (1/4) 4779K'   -> 'dan brown - inferno.epub'
+#   '[03/12] - "Dan Brown - Inferno.epub" yEnc (01/04) 4.7 MB'
+#                                                   -> 'dan brown - inferno.epub'
+
+import hashlib
+import json
+import re
+
+RULES_FILE = 'bin/normalize_rules.json'
+
+DEFAULT_RULES = [
+    # yEnc marker
+    [r'\byenc\b', ' '],
+    # Part and file counters: (1/4), [03/12], (01 of 12)
+    [r'[\(\[]\s*\d+\s*(?:/|of)\s*\d+\s*[\)\]]', ' '],
+    # File sizes: 4779K, 4.7 MB, 800 KB, 1,2 GiB, 123456 bytes. A unit
+    # needs its "b", except binsearch's bare K after 3+ digits, so titles
+    # like "40k" or "Book 5 T" are left alone.
+    [r'\b(?:\d+(?:[.,]\d+)?\s*(?:[kmgt]i?b|bytes)|\d{3,}k)(?![\w.])', ' '],
+    # Quotes around the file name
+    [r'["“”]', ' '],
+    # Separators left dangling at either end
+    [r'^[\s\-_.:]+|[\s\-_.:]+$', ''],
+    # Runs of whitespace
+    [r'\s+', ' '],
+]
+
+
+def compile_rules(rules):
+    return [(re.compile(pattern), replacement) for pattern, replacement in rules]
+
+
+def load_rules(path=RULES_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as json_file:
+            rules = json.load(json_file)
+    except FileNotFoundError:
+        return compile_rules(DEFAULT_RULES)
+    except (OSError, ValueError) as e:
+        print(f"Error: can't read {path}, using the default normalize rules: {e}")
+        return compile_rules(DEFAULT_RULES)
+
+    if not isinstance(rules, list):
+        print(f"Error: {path} should hold a list of [pattern, replacement] pairs, using the default normalize rules")
+        return compile_rules(DEFAULT_RULES)
+    for rule in rules:
+        if (not isinstance(rule, list) or len(rule) != 2
+                or not all(isinstance(part, str) for part in rule)):
+            print(f"Error: bad rule {rule!r} in {path}, using the default normalize rules")
+            return compile_rules(DEFAULT_RULES)
+        try:
+            re.compile(rule[0])
+        except re.error as e:
+            print(f"Error: bad pattern {rule[0]!r} in {path}, using the default normalize rules: {e}")
+            return compile_rules(DEFAULT_RULES)
+    return compile_rules(rules)
+
+
+RULES = load_rules()
+
+
+def normalize_subject(subject, rules=None):
+    text = (subject or '').lower()
+    for pattern, replacement in (rules if rules is not None else RULES):
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def item_key(subject, poster, item_group, rules=None):
+    # Compact digest of the normalized (Subject, Poster, ItemGroup)
+    canonical = '\x1f'.join((normalize_subject(subject, rules),
+                             (poster or '').strip().lower(),
+                             (item_group or '').strip().lower()))
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
@@ -0,0 +1,102 @@
+# db/database_operations/repository.py
+#
+# One database shared by several threads (the GUI and its refresh worker,
+# shard workers, the daemon). Database hands each thread its own
+# connection, opened on first use and reused after, so nothing pays for a
+# connect per call and no connection is used from two threads. The db_
+# functions are available as methods bound to the calling thread's
+# connection:
+#
+#   database = Database()              # db_get_path() unless a path is given
+#   database.get_found_items(search_id)   # db_get_found_items(conn, search_id)
+#   for row in database.iter_found_items(search_id):   # rows as stepped
+#       ...
+#   for row in database.iterate("SELECT ...", params):
+#       ...
+#
+# The row-returning reads have db_iter_ generator forms; the db_get_ ones
+# build their list from them.
+#
+# Connections are opened with check_same_thread off only so close() can
+# reclaim them from whichever thread shuts down; each is still used by the
+# thread that opened it alone.
+
+import threading
+
+from . import database_operations
+from .database_operations import db_connect, db_get_path
+
+# Rows fetched per step by iterate()
+ITER_BATCH = 500
+
+
+class Database:
+    def __init__(self, path=None):
+        self.path = path or db_get_path()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = {}  # thread -> connection
+
+    def connection(self):
+        # This thread's connection
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = db_connect(self.path, check_same_thread=False)
+            self.local.conn = conn
+            with self.lock:
+                self.close_finished_threads()
+                self.connections[threading.current_thread()] = conn
+        return conn
+
+    def close_finished_threads(self):
+        # Connections left behind by threads that have exited
+        for thread in [thread for thread in self.connections if not thread.is_alive()]:
+            self.connections.pop(thread).close()
+
+    def release(self):
+        # Close this thread's connection, e.g. at the end of a worker thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            self.local.conn = None
+            with self.lock:
+                self.connections.pop(threading.current_thread(), None)
+            conn.close()
+
+    def close(self):
+        # Close every thread's connection; call once the other threads are done
+        with self.lock:
+            connections = list(self.connections.values())
+            self.connections.clear()
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
+
+    def iterate(self, sql, parameters=()):
+        # Yields rows as they are stepped, ITER_BATCH at a time, instead of
+        # building the whole result list
+        cursor = self.connection().execute(sql, parameters)
+        cursor.arraysize = ITER_BATCH
+        try:
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def __getattr__(self, name):
+        # database.name(...) -> db_name(this thread's connection, ...)
+        function = getattr(database_operations, 'db_' + name, None)
+        if function is None or name in ('connect', 'create_db', 'set_path', 'get_path'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return function(self.connection(), *args, **kwargs)
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
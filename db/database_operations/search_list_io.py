@@ -0,0 +1,32 @@
+# db/database_operations/search_list_io.py
+#
+# Streaming import/export of the search list. Files are read and written a
+# line at a time, one search string per line, .csv or not: a search string
+# may itself contain commas ("Tolkien, J.R.R. epub"), so lines are taken
+# whole, as the GUI import always has.
+
+from .database_operations import db_add_search_strings, db_iter_search_strings
+
+
+def iter_search_list_file(path):
+    # Yields the non-blank search strings in a file, lazily
+    with open(path, 'r', encoding='utf-8-sig') as list_file:
+        for line in list_file:
+            search_string = line.strip()
+            if search_string:
+                yield search_string
+
+
+def import_search_list(conn, path):
+    # Returns (added, duplicates)
+    return db_add_search_strings(conn, iter_search_list_file(path))
+
+
+def export_search_list(conn, path):
+    # Returns the number of search strings written
+    count = 0
+    with open(path, 'w', encoding='utf-8') as list_file:
+        for search_string in db_iter_search_strings(conn):
+            list_file.write(search_string + '\n')
+            count += 1
+    return count
@@ -0,0 +1,79 @@
+# gui/found_cache.py
+#
+# In-memory cache of found items for the GUI, so re-selecting a search
+# string doesn't re-run its FoundList query. Entries are keyed by search
+# string and hold (search_id, generation, rows); a search's generation is
+# bumped by every db_ function that changes its found items, so an entry is
+# current exactly when its generation still matches.
+#
+# Checking the generation is one indexed read. Even that is skipped while
+# the database is provably unchanged: PRAGMA data_version moves when another
+# connection (a background refresh, another process) commits, and
+# total_changes when this connection writes.
+
+from collections import OrderedDict
+
+from db.database_operations import db_get_search_generation, db_get_found_items
+
+# Approximate memory the cached rows may use, and the per-row overhead
+# (tuple, ints, string headers) added to the text lengths when sizing them
+FOUND_CACHE_BYTES = 64 * 1024 * 1024
+ROW_OVERHEAD = 400
+
+
+def rows_size(rows):
+    return sum(len(row[3]) + len(row[4]) + len(row[5]) + len(row[6] or '') + ROW_OVERHEAD for row in rows)
+
+
+class FoundItemsCache:
+    def __init__(self, max_bytes=FOUND_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # search_string -> [search_id, generation, rows, size, token]
+        self.entries = OrderedDict()
+
+    def token(self, conn):
+        # Changes whenever anything has been committed to the database
+        return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+    def get(self, conn, search_string):
+        # Returns (search_id, generation, rows), or None if the search
+        # string no longer exists
+        token = self.token(conn)
+        entry = self.entries.get(search_string)
+        if entry and entry[4] == token:
+            self.entries.move_to_end(search_string)
+            return entry[0], entry[1], entry[2]
+
+        current = db_get_search_generation(conn, search_string)
+        if current is None:
+            self.discard(search_string)
+            return None
+        search_id, generation = current
+        if entry and entry[0] == search_id and entry[1] == generation:
+            entry[4] = token
+            self.entries.move_to_end(search_string)
+            return search_id, generation, entry[2]
+
+        rows = db_get_found_items(conn, search_id)
+        self.store(search_string, [search_id, generation, rows, rows_size(rows), token])
+        return search_id, generation, rows
+
+    def store(self, search_string, entry):
+        self.discard(search_string)
+        if entry[3] > self.max_bytes:
+            return
+        self.entries[search_string] = entry
+        self.size += entry[3]
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted[3]
+
+    def discard(self, search_string):
+        entry = self.entries.pop(search_string, None)
+        if entry:
+            self.size -= entry[3]
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
@@ -3,27 +3,36 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
+from tkinter import messagebox
 from datetime import datetime
-from bs4 import BeautifulSoup
-from io import StringIO
-import pandas as pd
-import requests
-import time
-import keyring
 import webbrowser
-import smtplib
-import sqlite3
+import threading
+import queue
 import json
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
 
 # My own defined db operations file.
 from db.database_operations import *
 
-DATABASE = 'bin/BookSearch.db'
+# The scrape pipeline lives in the retrieval package so headless runs don't
+# load tkinter; re-exported here for existing callers.
+from retrieval import get_url, retrieve_search_items, check_pattern
+from retrieval.filters import FIELDS, ACTIONS
+from gui.found_cache import FoundItemsCache
+
 ERROR_LOG_FILE = 'error_log.txt'
-OUTPUT_LOG_FILE = 'output_log.txt'
+
+# Treeview rows inserted per event-loop turn, and how often (ms) the GUI
+# checks on a background refresh
+TREEVIEW_CHUNK = 500
+REFRESH_POLL_MS = 100
+
+# Most results the Find box shows
+FIND_LIMIT = 1000
+
+# Scope shown for filter rules that apply to every search string
+ALL_SEARCHES = "All searches"
 
 def add_search_string(conn, entry_add, search_listbox):
     search_string = entry_add.get().strip()
@@ -34,19 +43,24 @@ def add_search_string(conn, entry_add, search_listbox):
 
 def import_csv(conn, search_listbox):
     # Open a file dialog to select a CSV file
-    file_path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
+    file_path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv"), ("Text Files", "*.txt")])
+
+    if file_path:
+        # Stream the file into SearchList in batched transactions
+        try:
+            added, duplicates = import_search_list(conn, file_path)
+            refresh_search_listbox(conn, search_listbox)
+            messagebox.showinfo("Import", f"Added {added} search string(s), {duplicates} duplicate(s) skipped.")
+        except Exception as e:
+            print("Error:", e)
 
+def export_csv(conn):
+    file_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                             filetypes=[("CSV Files", "*.csv"), ("Text Files", "*.txt")])
     if file_path:
-        # Read the CSV file
         try:
-            with open(file_path, 'r') as csv_file:
-                lines = csv_file.readlines()
-                for line in lines:
-                    # Strip leading and trailing whitespace from the line
-                    search_string = line.strip()
-                    if search_string and not db_check_search_string_exists(conn, search_string):
-                        db_add_search_string(conn, search_string)
-                refresh_search_listbox(conn, search_listbox)
+            count = export_search_list(conn, file_path)
+            messagebox.showinfo("Export", f"Exported {count} search string(s).")
         except Exception as e:
             print("Error:", e)
 
@@ -58,141 +72,209 @@ def delete_search_string(conn, search_listbox):
         refresh_search_listbox(conn, search_listbox)
 
 def refresh_search_listbox(conn, search_listbox):
+    # Rebuild only if the search list changed since it was last filled
+    generation = db_get_list_generation(conn)
+    if getattr(search_listbox, 'generation', None) == generation:
+        return
     search_listbox.delete(0, tk.END)
     search_strings = db_get_all_search_strings(conn)
     for search_string in search_strings:
         search_listbox.insert(tk.END, search_string)
+    search_listbox.generation = generation
 
 def retrieve_single_item(conn, search_listbox, found_treeview):
     selected_index = search_listbox.curselection()
     if selected_index:
         search_string = search_listbox.get(selected_index)
         
-        # Retrieve the search_id associated with the search_string
-        search_id = db_get_search_string_id(conn, search_string)
-        
-        # Perform the search and populate the FoundList
-        refresh_found_treeview(conn, search_id, found_treeview)
-
-def refresh_found_treeview(conn, search_id, found_treeview):
+        # Found items come from the cache unless the search's generation
+        # moved on since they were loaded
+        found = found_treeview.found_cache.get(conn, search_string)
+        if found is None:
+            return
+        search_id, generation, found_items = found
+
+        # Already showing exactly these rows
+        if getattr(found_treeview, 'shown', None) == (search_id, generation):
+            return
+        show_found_items(found_treeview, found_items)
+        found_treeview.shown = (search_id, generation)
+
+def find_found_items(conn, entry_find, search_listbox, found_treeview):
+    # Full-text search across every search string's found items
+    query = entry_find.get().strip()
+    if query:
+        search_listbox.selection_clear(0, tk.END)
+        show_found_items(found_treeview, db_search_found_items(conn, query, FIND_LIMIT))
+
+def show_found_items(found_treeview, found_items):
+    # Stop filling in rows for the previous selection
+    fill_job = getattr(found_treeview, 'fill_job', None)
+    if fill_job:
+        found_treeview.after_cancel(fill_job)
+        found_treeview.fill_job = None
+
+    found_treeview.shown = None
     found_treeview.delete(*found_treeview.get_children())
-    found_items = db_get_found_items(conn, search_id)
-    
-    for item in found_items:
+    insert_found_chunk(found_treeview, found_items, 0)
+
+def insert_found_chunk(found_treeview, found_items, start):
+    # Insert one chunk of rows, then hand control back to Tk before the
+    # next one so large result sets don't freeze the window
+    now = time.time()
+    for item in found_items[start:start + TREEVIEW_CHUNK]:
         # Extract item data
-        item_id, _, item_index, subject, poster, item_group, age = item
-        
+        item_id, _, item_index, subject, poster, item_group, age, posted_at = item
+
+        # Show the age as of now rather than as of the fetch
+        if posted_at is not None:
+            age = format_age(posted_at, now)
+
         # Insert data into the Treeview
         found_treeview.insert("", "end", values=(item_index, subject, poster, item_group, age))
 
-def get_url_data(conn, url, search_id, search_string):
-    # Compare the website data to the database
-    data = []
-    delta_list = []
-    items_to_delete = []
-    response = requests.get(url)
-    html = response.text
-    soup = BeautifulSoup(html, 'html.parser')
-    search_table = soup.find('table', {'class': 'border text-left border-black my-2 w-full table-fixed result-table'})
-    if search_table:
-        # Wrap the HTML string in a StringIO object
-        rows = search_table.find_all('tr')
+    start += TREEVIEW_CHUNK
+    if start < len(found_items):
+        found_treeview.fill_job = found_treeview.after(1, insert_found_chunk, found_treeview, found_items, start)
+    else:
+        found_treeview.fill_job = None
+
+def start_refresh(root, database, search_listbox, found_treeview, status_label, refresh_buttons, selected_only):
+    # Run a retrieval on a worker thread, on that thread's own connection
+    # from database; progress comes back through a queue that poll_refresh
+    # drains on the Tk thread.
+    search_strings = None
+    if selected_only:
+        selected_index = search_listbox.curselection()
+        if not selected_index:
+            return
+        search_strings = [search_listbox.get(selected_index)]
+
+    progress_queue = queue.Queue()
+
+    def worker():
         try:
-            for row in rows[1:]:  # Skip the header row
-                columns = row.find_all('td')
-
-                # Extracting data from the second div class within the row
-                anchor_tag = columns[2].find('a')
-
-                # Extracting title and other data from the columns as needed
-                title = anchor_tag.text.strip()
-
-                # Extracting additional information from the div with class 'flex-row'
-                flex_row_div = columns[2].find('div', {'class': 'flex-row'})
-                size = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border bg-white'}).text.strip()
-                
-                # Check if the 'complete' span exists before accessing its text
-                parts_span = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border complete bg-gray-100'})
-                parts = parts_span.text.strip() if parts_span else ''
-
-                email = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border bg-blue-100'}).text.strip()
-                groups = flex_row_div.find('span', {'class': 'rounded-lg px-2 border-gray-300 border bg-gray-100'}).text.strip()
-
-                col1_data = columns[0].text.strip()
-                col2_data = columns[1].text.strip()
-                col4_data = columns[3].text.strip()
-
-                # Append the extracted data to the list
-                data.append([col1_data, col2_data, title, size, parts, email, groups, col4_data])
-
-            # Creating a DataFrame using pandas
-            columns = ['Column1', 'ItemIndex', 'Subject', 'Size', 'Parts', 'Poster', 'ItemGroup', 'Age']
-            df = pd.DataFrame(data, columns=columns)
-            
-            # Filter rows based on the 'ItemGroup' column
-            df = df[~df['ItemGroup'].str.contains('german|dutch', case=False, na=False)]
-
-            # Reset the index of the DataFrame after filtering
-            df.reset_index(drop=True, inplace=True)
+            # An explicit refresh checks everything asked for, due or not
+            retrieve_search_items(search_strings=search_strings, schedule=False, conn=database.connection(),
+                                  progress=lambda done, total, search_string:
+                                      progress_queue.put(('progress', done, total, search_string)))
+            progress_queue.put(('done',))
         except Exception as e:
-            print("Error reading HTML:", e)
-
-        # Now iterate through db and list any items that are in the database
-        # but not in the dataframe
-        db_items = db_get_found_items(conn, search_id)
-        for db_item in db_items:
-            db_subject, db_poster, db_item_group = db_item[3], db_item[4], db_item[5]
-            item_exists_in_website = any(
-                (db_subject == row['Subject'] and
-                 db_poster == row['Poster'] and
-                 db_item_group == row['ItemGroup'])
-                for _, row in df.iterrows()
-            )
-
-            if not item_exists_in_website:
-                # Item exists in the database but not in the website, so add its id to the items_to_delete list
-                items_to_delete.append(db_item[0])  # item[0] is the primary key
-
-        # Iterate through the DataFrame and compare with items in the database
-        for _, row in df.iterrows():
-            item_exists_in_db = any(
-                item[3] == row['Subject'] and
-                item[4] == row['Poster'] and
-                item[5] == row['ItemGroup']
-                for item in db_items
-            )
-
-            if not item_exists_in_db:
-                # Add the item to the database
-                db_add_found_item(conn, search_id,
-                                  row['ItemIndex'],
-                                  row['Subject'],
-                                  row['Poster'],
-                                  row['ItemGroup'],
-                                  row['Age'])
-
-                # Add the item to the delta_list
-                delta_list.append({
-                    'ItemIndex': row['ItemIndex'],
-                    'Subject': row['Subject'],
-                    'Poster': row['Poster'],
-                    'ItemGroup': row['ItemGroup'],
-                    'Age': row['Age']
-                })
-
-    # Return both delta_list and items_to_delete
-    return delta_list, items_to_delete
-
-def get_url(search_string):
-    # Converts 'Piers Anthony epub' to
-    # 'https://binsearch.info/?q=Piers+Anthony+epub&max=100&adv_age=1100&server='
-
-    # Split the search string into individual words and join them with '+'
-    search_query = "+".join(search_string.split())
-
-    # Construct the URL
-    url = f"https://binsearch.info/?q={search_query}&max=100&adv_age=1100&server="
-    return url
+            progress_queue.put(('error', str(e)))
+        finally:
+            database.release()
+
+    for button in refresh_buttons:
+        button.state(['disabled'])
+    status_label.config(text="Refreshing...")
+    threading.Thread(target=worker, daemon=True).start()
+    root.after(REFRESH_POLL_MS, poll_refresh, root, database.connection(), search_listbox, found_treeview,
+               status_label, refresh_buttons, progress_queue)
+
+def poll_refresh(root, conn, search_listbox, found_treeview, status_label, refresh_buttons, progress_queue):
+    finished = False
+    while True:
+        try:
+            message = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == 'progress':
+            _, done, total, search_string = message
+            status_label.config(text=f"Refreshing {done}/{total}: {search_string}")
+        elif message[0] == 'done':
+            status_label.config(text=f"Refresh finished {datetime.now().strftime('%I:%M:%S %p')}")
+            finished = True
+        else:
+            status_label.config(text=f"Refresh failed: {message[1]}")
+            finished = True
+
+    if not finished:
+        root.after(REFRESH_POLL_MS, poll_refresh, root, conn, search_listbox, found_treeview,
+                   status_label, refresh_buttons, progress_queue)
+        return
+
+    for button in refresh_buttons:
+        button.state(['!disabled'])
+    # Show what the refresh found for the current selection
+    retrieve_single_item(conn, search_listbox, found_treeview)
+
+def refresh_filter_treeview(conn, filter_treeview):
+    filter_treeview.delete(*filter_treeview.get_children())
+    search_names = {entry[0]: entry[1] for entry in db_get_search_entries(conn)}
+    for rule_id, search_id, field, action, pattern in db_get_filter_rules(conn):
+        scope = ALL_SEARCHES if search_id is None else search_names.get(search_id, search_id)
+        filter_treeview.insert("", "end", iid=str(rule_id), values=(scope, field, action, pattern))
+
+def add_filter_rule(conn, window, combo_scope, combo_field, combo_action, entry_pattern, filter_treeview):
+    pattern = entry_pattern.get().strip()
+    if not pattern:
+        return
+    error = check_pattern(pattern)
+    if error:
+        messagebox.showerror("Filters", f"Invalid pattern: {error}", parent=window)
+        return
+    scope = combo_scope.get()
+    search_id = None if scope == ALL_SEARCHES else db_get_search_string_id(conn, scope)
+    if db_add_filter_rule(conn, search_id, combo_field.get(), combo_action.get(), pattern):
+        entry_pattern.delete(0, tk.END)
+        refresh_filter_treeview(conn, filter_treeview)
+
+def remove_filter_rule(conn, filter_treeview):
+    for rule_id in filter_treeview.selection():
+        db_remove_filter_rule(conn, int(rule_id))
+    refresh_filter_treeview(conn, filter_treeview)
+
+def open_filter_window(root, conn, search_listbox):
+    # Edit the include/exclude rules applied to result rows. Rules can be
+    # global or for the search string selected when the window was opened.
+    window = tk.Toplevel(root)
+    window.title("Result Filters")
+
+    filter_treeview = ttk.Treeview(window, columns=("Scope", "Field", "Action", "Pattern"), show="headings",
+                                   selectmode="extended")
+    for column in ("Scope", "Field", "Action", "Pattern"):
+        filter_treeview.heading(column, text=column)
+    filter_treeview.column("Field", width=70)
+    filter_treeview.column("Action", width=70)
+    scrollbar_filters = ttk.Scrollbar(window, orient=tk.VERTICAL, command=filter_treeview.yview)
+    filter_treeview.config(yscrollcommand=scrollbar_filters.set)
+
+    scopes = [ALL_SEARCHES]
+    selected_index = search_listbox.curselection()
+    if selected_index:
+        scopes.append(search_listbox.get(selected_index))
+
+    frame_add = ttk.Frame(window)
+    combo_scope = ttk.Combobox(frame_add, values=scopes, state="readonly")
+    combo_scope.set(scopes[-1])
+    combo_field = ttk.Combobox(frame_add, values=FIELDS, state="readonly", width=8)
+    combo_field.set('group')
+    combo_action = ttk.Combobox(frame_add, values=ACTIONS, state="readonly", width=8)
+    combo_action.set('exclude')
+    entry_pattern = ttk.Entry(frame_add)
+    button_add_rule = ttk.Button(frame_add, text="Add",
+                                 command=lambda: add_filter_rule(conn, window, combo_scope, combo_field,
+                                                                 combo_action, entry_pattern, filter_treeview))
+    entry_pattern.bind("<Return>", lambda event: add_filter_rule(conn, window, combo_scope, combo_field,
+                                                                 combo_action, entry_pattern, filter_treeview))
+    button_remove_rule = ttk.Button(window, text="Remove Selected",
+                                    command=lambda: remove_filter_rule(conn, filter_treeview))
+
+    combo_scope.grid(row=0, column=0, sticky="ew")
+    combo_field.grid(row=0, column=1, sticky="w")
+    combo_action.grid(row=0, column=2, sticky="w")
+    entry_pattern.grid(row=0, column=3, sticky="ew")
+    button_add_rule.grid(row=0, column=4, sticky="w")
+    frame_add.grid_columnconfigure(3, weight=1)
+
+    filter_treeview.grid(row=0, column=0, sticky="nsew")
+    scrollbar_filters.grid(row=0, column=1, sticky="ns")
+    frame_add.grid(row=1, column=0, columnspan=2, sticky="ew", pady=5)
+    button_remove_rule.grid(row=2, column=0, sticky="w")
+    window.grid_rowconfigure(0, weight=1)
+    window.grid_columnconfigure(0, weight=1)
+
+    refresh_filter_treeview(conn, filter_treeview)
 
 # Create a function to launch the search URL in a web browser
 def launch_url(search_string):
@@ -200,81 +282,6 @@ def launch_url(search_string):
     webbrowser.open(url)  # Open the URL in the default web browser
 
 
-def retrieve_search_items():
-    master_dict = {}
-    error_log = []
-
-    # Iterate through all the SearchList items and
-    # go to binsearch.info to get the latest
-    conn = sqlite3.connect(DATABASE)
-    search_strings = db_get_all_search_strings(conn)
-    for search_string in search_strings:
-        url = get_url(search_string)
-        search_id = db_get_search_string_id(conn, search_string)
-
-        try:
-            # Return a list of additions and deletions for this item
-            search_delta, items_to_delete = get_url_data(conn, url, search_id, search_string)
-            # Remove items from the database no longer on the website
-            db_remove_item_list(conn, search_id, items_to_delete)
-
-            if search_delta:
-                master_dict[search_string] = search_delta
-            # Don't scrape too fast
-            time.sleep(5)
-        except Exception as e:
-            error_log.append(f"Error for '{search_string}': {str(e)}")
-
-    # Close the database connection
-    conn.close()
-
-    # Create a timestamp
-    timestamp = datetime.now().strftime('%Y-%m-%d %I:%M:%S %p PST')
-
-    # Create the delta text for both the log file and email body
-    delta_text = []
-    with open(OUTPUT_LOG_FILE, 'a', encoding='utf-8') as output_file:
-        for search_string, delta_list in master_dict.items():
-            delta_text.append(f"{timestamp}")
-            delta_text.append(f"{search_string}")
-            delta_text.append("=" * len(search_string))
-            delta_text.append("{:<5} {:<30} {:<30} {:<20} {:<15}".format("Idx", "Subject", "Poster", "ItemGroup", "Age"))
-            for delta in delta_list:
-                delta_text.append("{:<5} {:<30} {:<30} {:<20} {:<15}".format(delta['ItemIndex'],
-                                                                              delta['Subject'],
-                                                                              delta['Poster'],
-                                                                              delta['ItemGroup'],
-                                                                              delta['Age']))
-            delta_text.append("")
-
-            # Write the delta text to the log file
-            output_file.write("\n".join(delta_text) + "\n")
-
-    # Send an email
-    subject = f"NNTP deltas {timestamp}"
-    body = "\n".join(delta_text)
-    EMAIL_ADDR = 'netmpowers@gmail.com' # Replace with your email address
-
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_ADDR
-    msg['To']   = EMAIL_ADDR
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-    try:
-        smtp_server = 'smtp.gmail.com'  # Replace with your SMTP server
-        smtp_port = 587                 # Replace with your SMTP port
-        smtp_username = EMAIL_ADDR      # Replace with your email address
-        smtp_password = keyring.get_password(smtp_server, EMAIL_ADDR)
-
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        text = msg.as_string()
-        server.sendmail(smtp_username, EMAIL_ADDR, text)
-        server.quit()
-    except Exception as e:
-        print("Error sending email:", e)
-
 def save_column_widths(found_treeview):
     # After adjusting column widths
     column_widths = {
@@ -308,8 +315,8 @@ def open_search(search_listbox):
         search_string = search_listbox.get(selected_index)
         launch_url(search_string)
 
-def on_closing(conn, root, found_treeview):
-    conn.close()
+def on_closing(database, root, found_treeview):
+    database.close()
     save_column_widths(found_treeview)
 
     # Save error log to a file
@@ -321,7 +328,8 @@ def on_closing(conn, root, found_treeview):
 def main_window():
     # Create SQLite database and establish a connection
     db_create_db()
-    conn = sqlite3.connect(DATABASE)
+    database = Database()
+    conn = database.connection()
 
     # Create or append the error log file
     with open(ERROR_LOG_FILE, 'a') as error_file:
@@ -376,6 +384,25 @@ def main_window():
     button_delete.grid(row=3, column=0, columnspan=2, sticky="w")  # Adjust columnspan
     button_open_search.grid(row=3, column=2, sticky="w")  # Adjust column
 
+    # Refresh buttons run the scrape in the background; the status label
+    # shows its progress
+    label_status = ttk.Label(frame_left, text="")
+    button_refresh_all = ttk.Button(frame_left, text="Refresh All")
+    button_refresh_selected = ttk.Button(frame_left, text="Refresh Selected")
+    refresh_buttons = (button_refresh_all, button_refresh_selected)
+    button_refresh_all.config(command=lambda: start_refresh(root, database, search_listbox, found_treeview,
+                                                            label_status, refresh_buttons, False))
+    button_refresh_selected.config(command=lambda: start_refresh(root, database, search_listbox, found_treeview,
+                                                                 label_status, refresh_buttons, True))
+    button_refresh_all.grid(row=4, column=0, columnspan=2, sticky="w")
+    button_refresh_selected.grid(row=4, column=2, sticky="w")
+    label_status.grid(row=5, column=0, columnspan=3, sticky="w")
+
+    # Include/exclude rules for result rows
+    button_filters = ttk.Button(frame_left, text="Filters...",
+                                command=lambda: open_filter_window(root, conn, search_listbox))
+    button_filters.grid(row=6, column=0, columnspan=2, sticky="w")
+
     # Right side (Found Items)
     frame_right = ttk.Frame(root)
     frame_right.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
@@ -383,6 +410,16 @@ def main_window():
     label_found = ttk.Label(frame_right, text="Found Items:")
     label_found.grid(row=0, column=0, sticky="w")
 
+    # Find box: full-text search over all found items
+    frame_find = ttk.Frame(frame_right)
+    entry_find = ttk.Entry(frame_find)
+    button_find = ttk.Button(frame_find, text="Find",
+                             command=lambda: find_found_items(conn, entry_find, search_listbox, found_treeview))
+    entry_find.bind("<Return>", lambda event: find_found_items(conn, entry_find, search_listbox, found_treeview))
+    entry_find.grid(row=0, column=0, sticky="ew")
+    button_find.grid(row=0, column=1, sticky="w")
+    frame_find.grid(row=0, column=0, sticky="e")
+
     # Create a Treeview widget with columns
     found_treeview = ttk.Treeview(frame_right,
                                   columns=("Indx", "Subject", "Poster", "Item Group", "Age"),
@@ -394,6 +431,7 @@ def main_window():
     found_treeview.heading("#3", text="Poster")
     found_treeview.heading("#4", text="Item Group")
     found_treeview.heading("#5", text="Age")
+    found_treeview.found_cache = FoundItemsCache()
 
     # Create a vertical scrollbar for the Treeview
     scrollbar_treeview = ttk.Scrollbar(frame_right, orient=tk.VERTICAL, command=found_treeview.yview)
@@ -404,17 +442,23 @@ def main_window():
                                    text="Import CSV",
                                    command=lambda: import_csv(conn, search_listbox))
 
-    # Grid layout for Found Treeview, Scrollbar, and Import CSV button
+    # 'Export CSV' button next to it
+    button_export_csv = ttk.Button(frame_right,
+                                   text="Export CSV",
+                                   command=lambda: export_csv(conn))
+
+    # Grid layout for Found Treeview, Scrollbar, and Import/Export CSV buttons
     label_found.grid(row=0, column=0, sticky="w")
     found_treeview.grid(row=1, column=0, sticky="nsew")
     scrollbar_treeview.grid(row=1, column=1, sticky="ns")
     button_import_csv.grid(row=2, column=0, columnspan=2, sticky="w")
+    button_export_csv.grid(row=2, column=0, columnspan=2, sticky="e")
 
     # Initialize the Search Listbox
     refresh_search_listbox(conn, search_listbox)
 
     # Configure the main window to close the connection when closed
-    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(conn, root, found_treeview))
+    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(database, root, found_treeview))
 
     # Grid row and column weights to make the widgets expand properly
     root.grid_rowconfigure(0, weight=1)
@@ -0,0 +1,54 @@
+# retrieval/__init__.py
+
+from .rate_limiter import (
+    TokenBucket,
+    HostRateLimiter,
+    polite_get,
+)
+
+from .http_cache import (
+    PageResponse,
+    make_session,
+)
+
+from .scheduler import (
+    due_searches,
+    check_interval,
+)
+
+from .parser import (
+    ResultRow,
+    ResultTableParser,
+    parse_result_table,
+)
+
+from .filters import (
+    RowFilter,
+    check_pattern,
+    compile_filters,
+)
+
+from .stats import (
+    RunStats,
+    SearchStats,
+    write_metrics,
+)
+
+from .retrieval import (
+    get_url,
+    get_url_data,
+    retrieve_search_items,
+)
+
+from .notify import (
+    queue_digest,
+    send_outbox,
+)
+
+from .daemon import (
+    run_daemon,
+)
+
+from .shard import (
+    run_shard_worker,
+)
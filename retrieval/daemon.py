@@ -0,0 +1,111 @@
+# retrieval/daemon.py
+#
+# Long-running retrieval: one warm process, database connection and HTTP
+# session running retrieve_search_items every `interval` seconds.
+#
+#   SIGTERM / SIGINT  finish the searches in flight, then exit
+#   SIGHUP            finish the searches in flight, then start a new cycle
+#                     straight away (the search list is read again at the
+#                     start of every cycle)
+#
+# Progress is written to a small JSON status file after every search.
+
+from datetime import datetime
+import json
+import os
+import signal
+import threading
+import time
+
+from db.database_operations import Database
+from .http_cache import make_session
+from .retrieval import retrieve_search_items, RETRIEVE_WORKERS
+
+DAEMON_INTERVAL = 60 * 60  # seconds between the start of two cycles
+STATUS_FILE = 'bin/daemon_status.json'
+
+
+def write_status(status_file, status):
+    # Write to a temp file and rename, so readers never see half a file
+    temp_file = status_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as json_file:
+        json.dump(status, json_file, indent=2)
+    os.replace(temp_file, status_file)
+
+
+def run_daemon(interval=DAEMON_INTERVAL, status_file=STATUS_FILE, workers=RETRIEVE_WORKERS, **retrieve_options):
+    stop_event = threading.Event()   # the daemon is shutting down
+    cycle_stop = threading.Event()   # the current cycle should wind down
+    wake_event = threading.Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+        cycle_stop.set()
+        wake_event.set()
+
+    def request_reload(signum, frame):
+        cycle_stop.set()
+        wake_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, 'SIGHUP'):  # Not on Windows
+        signal.signal(signal.SIGHUP, request_reload)
+
+    status = {
+        'pid': os.getpid(),
+        'state': 'starting',
+        'cycle': 0,
+        'current_search': None,
+        'done': 0,
+        'total': 0,
+        'queue_depth': 0,
+        'last_error': None,
+        'last_cycle_started': None,
+        'last_cycle_finished': None,
+        'next_cycle': None,
+    }
+
+    def progress(done, total, search_string):
+        status.update(current_search=search_string, done=done, total=total, queue_depth=total - done)
+        write_status(status_file, status)
+
+    database = Database()
+    conn = database.connection()
+    session = make_session(workers)
+    try:
+        while not stop_event.is_set():
+            wake_event.clear()
+            cycle_stop = threading.Event()
+            if stop_event.is_set():  # stopped before this cycle's event existed
+                break
+            started = time.time()
+            status.update(state='running', cycle=status['cycle'] + 1, current_search=None, done=0, total=0,
+                          queue_depth=0, last_cycle_started=datetime.now().isoformat(timespec='seconds'),
+                          next_cycle=None)
+            write_status(status_file, status)
+
+            try:
+                _, error_log = retrieve_search_items(workers=workers, conn=conn, session=session,
+                                                     stop_event=cycle_stop, progress=progress,
+                                                     **retrieve_options)
+                if error_log:
+                    status['last_error'] = error_log[-1]
+            except Exception as e:
+                status['last_error'] = f"Cycle {status['cycle']} failed: {e}"
+
+            # After a SIGHUP the next cycle starts straight away
+            next_cycle = time.time() if wake_event.is_set() else started + interval
+            status.update(state='stopping' if stop_event.is_set() else 'idle', current_search=None,
+                          last_cycle_finished=datetime.now().isoformat(timespec='seconds'),
+                          next_cycle=datetime.fromtimestamp(next_cycle).isoformat(timespec='seconds'))
+            write_status(status_file, status)
+
+            # Sleep until the next cycle, a SIGHUP or a stop request
+            while not wake_event.is_set() and time.time() < next_cycle:
+                wake_event.wait(min(60, max(0.0, next_cycle - time.time())))
+    finally:
+        session.close()
+        database.close()
+        status.update(state='stopped', next_cycle=None)
+        write_status(status_file, status)
@@ -0,0 +1,85 @@
+# retrieval/filters.py
+#
+# Result filter rules (the FilterRules table), compiled once per run.
+#
+# A rule includes or excludes rows whose subject, poster, group or size
+# matches a regular expression (case-insensitive, re.search semantics).
+# Global rules apply to every search, the rest only to their own search
+# string. A row is kept when no exclude rule matches it and, for each field
+# that has include rules, at least one of them matches.
+#
+# All patterns for one field and action are joined into a single
+# alternation, so checking a row costs at most one regex search per field
+# however many rules there are. The parser runs the check before it builds
+# the row.
+
+import re
+
+FIELDS = ('group', 'poster', 'size', 'subject')  # cheapest, most selective first
+ACTIONS = ('include', 'exclude')
+
+
+def check_pattern(pattern):
+    # Returns None if the pattern compiles, otherwise the error message
+    try:
+        re.compile(pattern)
+        return None
+    except re.error as e:
+        return str(e)
+
+
+def combine_patterns(patterns):
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+
+class RowFilter:
+    __slots__ = ('include', 'exclude')
+
+    def __init__(self, rules=()):
+        # rules: iterable of (field, action, pattern)
+        patterns = {(field, action): [] for field in FIELDS for action in ACTIONS}
+        for field, action, pattern in rules:
+            error = check_pattern(pattern)
+            if error:
+                print(f"Error: skipping {action} rule {pattern!r} on {field}: {error}")
+                continue
+            patterns[(field, action)].append(pattern)
+
+        # Kept as (position in FIELDS, compiled matcher) pairs
+        self.include = [(position, combine_patterns(patterns[(field, 'include')]))
+                        for position, field in enumerate(FIELDS) if patterns[(field, 'include')]]
+        self.exclude = [(position, combine_patterns(patterns[(field, 'exclude')]))
+                        for position, field in enumerate(FIELDS) if patterns[(field, 'exclude')]]
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    def accepts(self, values):
+        # values: the row's texts in FIELDS order
+        for position, matcher in self.exclude:
+            if matcher.search(values[position]):
+                return False
+        for position, matcher in self.include:
+            if not matcher.search(values[position]):
+                return False
+        return True
+
+
+def compile_filters(rules):
+    # rules: (id, search_id, field, action, pattern) rows from
+    # db_get_filter_rules. Returns {search_id: RowFilter}; the None entry
+    # holds the global rules and serves searches without rules of their own.
+    global_rules = [rule[2:] for rule in rules if rule[1] is None]
+    search_rules = {}
+    for rule in rules:
+        if rule[1] is not None:
+            search_rules.setdefault(rule[1], list(global_rules)).append(rule[2:])
+
+    filters = {None: RowFilter(global_rules)}
+    for search_id, field_rules in search_rules.items():
+        filters[search_id] = RowFilter(field_rules)
+    return filters
+
+
+def filter_for(filters, search_id):
+    return filters.get(search_id, filters[None])
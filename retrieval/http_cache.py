@@ -0,0 +1,59 @@
+# retrieval/http_cache.py
+#
+# One pooled keep-alive session per run, plus the bits of the response cache
+# that run on the fetch threads: conditional request headers and the body
+# digest. The cache itself is the ResponseCache table (see
+# db_get_response_cache / db_set_response_cache).
+
+from collections import namedtuple
+import hashlib
+
+# A fetched result page. `unchanged` means the server answered 304 or sent
+# the same bytes as last time, in which case `text` is None. `size` is the
+# body length in bytes and `elapsed` the server latency (request sent to
+# response headers) in seconds.
+PageResponse = namedtuple('PageResponse', ['unchanged', 'text', 'etag', 'last_modified', 'content_hash',
+                                           'size', 'elapsed'], defaults=(0, 0.0))
+
+
+def make_session(pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # Enough pooled connections for every worker to keep its own alive
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def conditional_headers(cached):
+    # cached is (etag, last_modified, content_hash) from ResponseCache, or None
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def cached_page(response, cached):
+    # Turn a response into a PageResponse, comparing against the cache entry
+    elapsed = response.elapsed.total_seconds()
+    if response.status_code == 304 and cached:
+        return PageResponse(True, None, cached[0], cached[1], cached[2], 0, elapsed)
+
+    body = response.content
+    digest = content_hash(body)
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if cached and cached[2] == digest:
+        return PageResponse(True, None, etag, last_modified, digest, len(body), elapsed)
+    return PageResponse(False, response.text, etag, last_modified, digest, len(body), elapsed)
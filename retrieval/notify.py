@@ -0,0 +1,168 @@
+# retrieval/notify.py
+#
+# Email notifications through an outbox table. A run only queues its digest
+# (one quick insert); send_outbox() then delivers everything pending over a
+# single authenticated SMTP connection, merging small digests into one
+# message, and leaves failures in the outbox to be retried with backoff.
+#
+# Point SMTP_SERVER/SMTP_PORT at a local stand-in (for example
+# "python -m aiosmtpd -n -l localhost:8025") with starttls=False to test.
+
+import time
+
+from db.database_operations import (
+    db_add_notifications,
+    db_get_pending_notifications,
+    db_mark_notifications_sent,
+    db_mark_notifications_failed,
+)
+from .report import HTML_START, HTML_END, utf8_size
+
+EMAIL_ADDR = 'netmpowers@gmail.com'  # Replace with your email address
+SMTP_SERVER = 'smtp.gmail.com'       # Replace with your SMTP server
+SMTP_PORT = 587                      # Replace with your SMTP port
+SMTP_STARTTLS = True
+
+# Largest message to send, as encoded on the wire; bigger digests are split
+# into parts. HEADER_BYTES is left for the headers and MIME boundaries.
+MAX_MESSAGE_BYTES = 5 * 1024 * 1024
+HEADER_BYTES = 4096
+
+# Failed sends are retried after RETRY_BASE_SECONDS, doubling per attempt
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 3600
+
+
+def body_budget(max_bytes):
+    # Largest UTF-8 body that still fits in a max_bytes message. MIMEText
+    # base64-encodes non-ASCII bodies: 57 bytes to every 78-byte line.
+    return (max_bytes - HEADER_BYTES) * 57 // 78
+
+
+def merge_bodies(bodies, subtype):
+    # One body from several digests; HTML ones become a single document
+    if subtype == 'html':
+        inner = [body.removeprefix(HTML_START).removesuffix(HTML_END) for body in bodies]
+        return HTML_START + "<hr>\n".join(inner) + HTML_END
+    return "\n".join(bodies)
+
+
+def queue_digest(conn, subject, report, max_bytes=MAX_MESSAGE_BYTES):
+    # Add a run's digest (a RunReport) to the outbox, already split at
+    # section boundaries into complete bodies that fit in a message
+    parts = report.email_bodies(body_budget(max_bytes))
+    created_at = int(time.time())
+    if len(parts) > 1:
+        notifications = [(created_at, f"{subject} (part {number}/{len(parts)})", part, report.email_subtype)
+                         for number, part in enumerate(parts, start=1)]
+    else:
+        notifications = [(created_at, subject, parts[0], report.email_subtype)]
+    return db_add_notifications(conn, notifications)
+
+
+def batch_notifications(pending, max_bytes=MAX_MESSAGE_BYTES):
+    # Merge consecutive pending notifications of the same subtype into
+    # messages of at most max_bytes. Returns (ids, subject, body, subtype).
+    budget = body_budget(max_bytes)
+    messages = []
+    batch = []
+    size = 0
+
+    def flush():
+        if not batch:
+            return
+        ids = [notification[0] for notification in batch]
+        if len(batch) == 1:
+            subject = batch[0][1]
+            body = batch[0][2]
+        else:
+            subject = f"{batch[-1][1]} (+{len(batch) - 1} earlier)"
+            body = merge_bodies([notification[2] for notification in batch], batch[0][3])
+        messages.append((ids, subject, body, batch[0][3]))
+
+    for notification in pending:
+        # Counted whole, wrapper and separator included, which is a little
+        # more than it adds to a merged body
+        body_size = utf8_size(notification[2]) + len("<hr>\n")
+        if batch and (notification[3] != batch[0][3] or size + body_size > budget):
+            flush()
+            batch = []
+            size = 0
+        batch.append(notification)
+        size += body_size
+    flush()
+    return messages
+
+
+def retry_after(attempts):
+    return min(RETRY_BASE_SECONDS * (2 ** attempts), RETRY_MAX_SECONDS)
+
+
+def open_smtp(host, port, starttls, username, password):
+    import smtplib
+
+    server = smtplib.SMTP(host, port, timeout=60)
+    if starttls:
+        server.starttls()
+    if password:
+        server.login(username, password)
+    return server
+
+
+def send_outbox(conn, host=SMTP_SERVER, port=SMTP_PORT, starttls=SMTP_STARTTLS, sender=EMAIL_ADDR,
+                recipient=EMAIL_ADDR, password=None, max_bytes=MAX_MESSAGE_BYTES):
+    # Deliver every due notification. The SMTP connection is opened on the
+    # first message and reused for the rest; if it breaks, the failed
+    # message is rescheduled and the next one reconnects.
+    # Returns (messages sent, messages failed).
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    now = int(time.time())
+    pending = db_get_pending_notifications(conn, now)
+    if not pending:
+        return 0, 0
+    attempts = {notification[0]: notification[4] for notification in pending}
+
+    if password is None:
+        try:
+            import keyring
+            password = keyring.get_password(host, sender)
+        except Exception as e:
+            print("Error reading SMTP password:", e)
+
+    sent = 0
+    failed = 0
+    server = None
+    try:
+        for ids, subject, body, subtype in batch_notifications(pending, max_bytes):
+            msg = MIMEMultipart()
+            msg['From'] = sender
+            msg['To'] = recipient
+            msg['Subject'] = subject
+            msg.attach(MIMEText(body, subtype))
+            try:
+                if server is None:
+                    server = open_smtp(host, port, starttls, sender, password)
+                server.sendmail(sender, [recipient], msg.as_string())
+                db_mark_notifications_sent(conn, ids, int(time.time()))
+                sent += 1
+            except (smtplib.SMTPException, OSError) as e:
+                print("Error sending email:", e)
+                next_attempt = int(time.time()) + retry_after(max(attempts[i] for i in ids))
+                db_mark_notifications_failed(conn, ids, str(e), next_attempt)
+                failed += 1
+                if server is not None:
+                    try:
+                        server.close()
+                    except OSError:
+                        pass
+                    server = None
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+    return sent, failed
@@ -0,0 +1,190 @@
+# retrieval/parser.py
+#
+# Narrow, streaming parser for the binsearch result table.
+#
+# Instead of building a BeautifulSoup tree of the whole page and then
+# searching it with long class strings, this feeds only the part of the
+# page from the result table onwards to a stdlib HTMLParser, captures just
+# the text the scraper needs, and stops as soon as the table is closed.
+# An optional RowFilter (retrieval/filters.py) drops rows before they are
+# built.
+
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# One result row, same fields (and order) as the old DataFrame columns
+ResultRow = namedtuple('ResultRow', ['Column1', 'ItemIndex', 'Subject', 'Size', 'Parts', 'Poster', 'ItemGroup', 'Age'])
+
+RESULT_TABLE_CLASS = 'result-table'
+FLEX_ROW_CLASS = 'flex-row'
+SIZE_CLASS = 'rounded-lg px-2 border-gray-300 border bg-white'
+PARTS_CLASS = 'rounded-lg px-2 border-gray-300 border complete bg-gray-100'
+POSTER_CLASS = 'rounded-lg px-2 border-gray-300 border bg-blue-100'
+GROUP_CLASS = 'rounded-lg px-2 border-gray-300 border bg-gray-100'
+
+# Elements that never get an end tag
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+             'link', 'meta', 'source', 'track', 'wbr'}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ResultCell:
+    __slots__ = ('text', 'anchor', 'spans')
+
+    def __init__(self):
+        self.text = []      # all text in the cell
+        self.anchor = None  # text of the first <a>
+        self.spans = {}     # class -> text of the first span inside div.flex-row
+
+
+def cell_text(parts):
+    return ''.join(parts).strip() if parts is not None else None
+
+
+class ResultTableParser(HTMLParser):
+    def __init__(self, row_filter=None):
+        super().__init__(convert_charrefs=True)
+        self.row_filter = row_filter or None
+        self.found = False      # saw the result table
+        self.row_count = 0      # result rows seen, filtered out or not
+        self.done = False       # result table has been closed
+        self.rows = []          # finished rows not yet handed out
+        self.stack = []         # open elements inside the table: [tag, capture, is_flex]
+        self.captures = []      # text buffers currently receiving data
+        self.flex_depth = 0
+        self.header_skipped = False
+        self.cells = None       # cells of the current <tr>
+        self.cell = None        # current <td>
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if not self.stack:
+            if tag == 'table' and RESULT_TABLE_CLASS in (dict(attrs).get('class') or '').split():
+                self.found = True
+                self.stack.append(['table', None, False])
+            return
+        if tag in VOID_TAGS:
+            return
+
+        # Browsers allow </td> and </tr> to be left out
+        if tag == 'td' and self.cell is not None:
+            self.unwind('td')
+        elif tag == 'tr' and self.cells is not None:
+            self.unwind('tr')
+
+        capture = None
+        is_flex = False
+        if tag == 'tr':
+            self.cells = []
+        elif tag == 'td' and self.cells is not None:
+            self.cell = ResultCell()
+            capture = self.cell.text
+        elif self.cell is not None:
+            if tag == 'a' and self.cell.anchor is None:
+                capture = self.cell.anchor = []
+            elif tag in ('div', 'span'):
+                css = ' '.join((dict(attrs).get('class') or '').split())
+                if tag == 'div' and FLEX_ROW_CLASS in css.split():
+                    is_flex = True
+                    self.flex_depth += 1
+                elif tag == 'span' and self.flex_depth and css not in self.cell.spans:
+                    capture = self.cell.spans[css] = []
+
+        if capture is not None:
+            self.captures.append(capture)
+        self.stack.append([tag, capture, is_flex])
+
+    def handle_endtag(self, tag):
+        if self.done or not self.stack:
+            return
+        if any(frame[0] == tag for frame in self.stack):
+            self.unwind(tag)
+
+    def handle_data(self, data):
+        for capture in self.captures:
+            capture.append(data)
+
+    def unwind(self, tag):
+        # Close open elements up to and including the innermost `tag`
+        while self.stack:
+            name, capture, is_flex = self.stack.pop()
+            if capture is not None:
+                self.captures.pop()
+            if is_flex:
+                self.flex_depth -= 1
+            if name == 'td':
+                if self.cells is not None and self.cell is not None:
+                    self.cells.append(self.cell)
+                self.cell = None
+            elif name == 'tr':
+                self.end_row()
+            if name == tag:
+                break
+        if not self.stack:
+            self.done = True
+
+    def end_row(self):
+        cells, self.cells = self.cells, None
+        self.cell = None
+        if cells is None:
+            return
+        if not self.header_skipped:
+            self.header_skipped = True  # Skip the header row
+            return
+
+        # Rows without the expected title/size/poster/group layout are skipped
+        if len(cells) < 4 or cells[2].anchor is None:
+            return
+        spans = cells[2].spans
+        if SIZE_CLASS not in spans or POSTER_CLASS not in spans or GROUP_CLASS not in spans:
+            return
+
+        self.row_count += 1
+
+        subject = cell_text(cells[2].anchor)
+        size = cell_text(spans[SIZE_CLASS])
+        poster = cell_text(spans[POSTER_CLASS])
+        group = cell_text(spans[GROUP_CLASS])
+        if self.row_filter is not None and not self.row_filter.accepts((group, poster, size, subject)):
+            return
+
+        self.rows.append(ResultRow(
+            cell_text(cells[0].text),
+            cell_text(cells[1].text),
+            subject,
+            size,
+            cell_text(spans.get(PARTS_CLASS)) or '',  # 'complete' span is optional
+            poster,
+            group,
+            cell_text(cells[3].text),
+        ))
+
+    def iter_rows(self, html, chunk_size=CHUNK_SIZE):
+        # Start at the <table> tag in front of the first 'result-table'
+        # mention and stop feeding once the table has been closed.
+        position = html.find(RESULT_TABLE_CLASS)
+        if position < 0:
+            return
+        start = max(html.rfind('<table', 0, position), 0)
+
+        for offset in range(start, len(html), chunk_size):
+            self.feed(html[offset:offset + chunk_size])
+            rows, self.rows = self.rows, []
+            yield from rows
+            if self.done:
+                return
+        self.close()
+        if self.stack:
+            self.unwind('table')  # Page ended inside the table
+        rows, self.rows = self.rows, []
+        yield from rows
+
+
+def parse_result_table(html, row_filter=None):
+    # Returns the list of result rows, or None when the page has no result
+    # table at all (as opposed to a table with no rows).
+    parser = ResultTableParser(row_filter)
+    rows = list(parser.iter_rows(html))
+    return rows if parser.found else None
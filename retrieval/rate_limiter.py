@@ -0,0 +1,99 @@
+# retrieval/rate_limiter.py
+#
+# Politeness for the scraper: a token bucket per host with jitter, plus a
+# GET helper that backs off on 429/5xx instead of sleeping a fixed time.
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# HTTP status codes that mean "slow down / try again later"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    # Refills `rate` tokens per second up to `capacity`. Every request takes
+    # one token; callers block until one is available.
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def penalize(self, delay):
+        # Hold back every caller of this bucket for `delay` seconds
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 0.0
+
+
+class HostRateLimiter:
+    # One TokenBucket per host, shared by all worker threads.
+    def __init__(self, rate=1.0, burst=1, jitter=0.5):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def wait(self, url):
+        self.bucket(url).acquire()
+        # Spread requests out a little so we don't hit the host in lockstep
+        if self.jitter:
+            time.sleep(random.uniform(0, self.jitter))
+
+    def backoff(self, url, delay):
+        self.bucket(url).penalize(delay)
+
+
+def retry_delay(response, attempt, backoff_base):
+    # Honour a numeric Retry-After header, otherwise back off exponentially
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return float(retry_after)
+    return backoff_base * (2 ** attempt) + random.uniform(0, backoff_base)
+
+
+def polite_get(url, limiter, retries=4, backoff_base=5.0, timeout=30, session=None, headers=None):
+    # GET `url` through the per-host limiter, retrying on 429/5xx and
+    # connection errors. Raises once the retries are used up.
+    import requests
+
+    getter = session or requests
+    for attempt in range(retries + 1):
+        limiter.wait(url)
+        try:
+            response = getter.get(url, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            limiter.backoff(url, retry_delay(None, attempt, backoff_base))
+            continue
+
+        if response.status_code not in RETRY_STATUS:
+            return response
+        if attempt == retries:
+            response.raise_for_status()
+        limiter.backoff(url, retry_delay(response, attempt, backoff_base))
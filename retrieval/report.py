@@ -0,0 +1,164 @@
+# retrieval/report.py
+#
+# Run report, built one search at a time. Each search's section is rendered
+# once and appended to the log file(s) straight away, so time, memory and
+# log size stay linear in the number of changes. The email body is rendered
+# at the end, split into complete documents that each fit in a message.
+#
+# Renderers: plain text (the original output_log.txt layout), HTML, JSONL.
+
+from html import escape
+import json
+
+REPORT_FILES = {
+    'text': 'output_log.txt',
+    'html': 'output_log.html',
+    'jsonl': 'output_log.jsonl',
+}
+
+ROW_FORMAT = "{:<5} {:<30} {:<30} {:<20} {:<15}"
+DELTA_FIELDS = ('ItemIndex', 'Subject', 'Poster', 'ItemGroup', 'Age')
+
+# What wraps every HTML email body
+HTML_START = "<html><body>\n"
+HTML_END = "</body></html>\n"
+
+
+def utf8_size(text):
+    return len(text.encode('utf-8'))
+
+
+class TextRenderer:
+    mime_subtype = 'plain'
+
+    def start(self, timestamp):
+        return ''
+
+    def section(self, timestamp, search_string, delta_list):
+        lines = [timestamp, search_string, "=" * len(search_string),
+                 ROW_FORMAT.format("Idx", "Subject", "Poster", "ItemGroup", "Age")]
+        for delta in delta_list:
+            lines.append(ROW_FORMAT.format(*(delta[field] for field in DELTA_FIELDS)))
+        lines.append("")
+        return "\n".join(lines) + "\n"
+
+    def end(self):
+        return ''
+
+
+class HtmlRenderer:
+    mime_subtype = 'html'
+
+    def start(self, timestamp):
+        return f"{HTML_START}<h2>NNTP deltas {escape(timestamp)}</h2>\n"
+
+    def section(self, timestamp, search_string, delta_list):
+        # The run's timestamp goes in every heading: logs only get sections,
+        # so this is what tells one run's entries from the next
+        parts = [f"<h3>{escape(search_string)} <small>{escape(timestamp)}</small></h3>\n<table>\n<tr>",
+                 "".join(f"<th>{field}</th>" for field in DELTA_FIELDS), "</tr>\n"]
+        for delta in delta_list:
+            parts.append("<tr>" + "".join(f"<td>{escape(str(delta[field]))}</td>" for field in DELTA_FIELDS)
+                         + "</tr>\n")
+        parts.append("</table>\n")
+        return "".join(parts)
+
+    def end(self):
+        return HTML_END
+
+
+class JsonlRenderer:
+    mime_subtype = 'plain'
+
+    def start(self, timestamp):
+        return ''
+
+    def section(self, timestamp, search_string, delta_list):
+        # One line per added item
+        return "".join(json.dumps(dict(delta, timestamp=timestamp, search_string=search_string)) + "\n"
+                       for delta in delta_list)
+
+    def end(self):
+        return ''
+
+
+RENDERERS = {
+    'text': TextRenderer,
+    'html': HtmlRenderer,
+    'jsonl': JsonlRenderer,
+}
+
+
+class RunReport:
+    # log_formats: which REPORT_FILES to append to; email_format: how the
+    # email body is rendered
+    def __init__(self, timestamp, log_formats=('text',), email_format='text'):
+        self.timestamp = timestamp
+        self.sections = 0
+        self.logs = []
+        for log_format in log_formats:
+            self.logs.append((RENDERERS[log_format](), open(REPORT_FILES[log_format], 'a', encoding='utf-8')))
+        self.email_renderer = RENDERERS[email_format]()
+        self.email_sections = []  # (search_string, delta_list)
+
+    def add(self, search_string, delta_list):
+        for renderer, log_file in self.logs:
+            log_file.write(renderer.section(self.timestamp, search_string, delta_list))
+            log_file.flush()
+        self.email_sections.append((search_string, delta_list))
+        self.sections += 1
+
+    def render_section(self, search_string, delta_list, max_bytes):
+        # One search's email section, cut into several sections of the same
+        # search if it is bigger than max_bytes
+        section = self.email_renderer.section(self.timestamp, search_string, delta_list)
+        if utf8_size(section) <= max_bytes or len(delta_list) <= 1:
+            yield section
+            return
+        middle = len(delta_list) // 2
+        yield from self.render_section(search_string, delta_list[:middle], max_bytes)
+        yield from self.render_section(search_string, delta_list[middle:], max_bytes)
+
+    def email_body(self):
+        return (self.email_renderer.start(self.timestamp)
+                + "".join(self.email_renderer.section(self.timestamp, search_string, delta_list)
+                          for search_string, delta_list in self.email_sections)
+                + self.email_renderer.end())
+
+    def email_bodies(self, max_bytes):
+        # The email body as complete documents of at most max_bytes (UTF-8)
+        # each, broken between sections. Only a single item too big for a
+        # message on its own can exceed max_bytes.
+        start = self.email_renderer.start(self.timestamp)
+        end = self.email_renderer.end()
+        overhead = utf8_size(start) + utf8_size(end)
+        bodies = []
+        current = []
+        size = overhead
+        for search_string, delta_list in self.email_sections:
+            for section in self.render_section(search_string, delta_list, max_bytes - overhead):
+                section_size = utf8_size(section)
+                if current and size + section_size > max_bytes:
+                    bodies.append(start + "".join(current) + end)
+                    current = []
+                    size = overhead
+                current.append(section)
+                size += section_size
+        if current or not bodies:
+            bodies.append(start + "".join(current) + end)
+        return bodies
+
+    @property
+    def email_subtype(self):
+        return self.email_renderer.mime_subtype
+
+    def close(self):
+        for _, log_file in self.logs:
+            log_file.close()
+        self.logs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,404 @@
+# retrieval/retrieval.py
+#
+# The scrape pipeline: fetch each search's result pages, diff them against
+# FoundList, and report/email the additions. Nothing here imports tkinter,
+# so BookSearch.py -r runs without loading the GUI stack.
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import time
+
+from db.database_operations import (
+    db_connect,
+    db_get_search_entries,
+    db_set_full_sweep,
+    db_record_search_check,
+    db_get_found_item_keys,
+    db_add_found_items,
+    db_remove_item_list,
+    db_get_response_cache,
+    db_set_response_cache,
+    db_get_filter_rules,
+    db_add_run_history,
+    db_prune_found_items,
+    item_key,
+    parse_age,
+)
+from .rate_limiter import HostRateLimiter, polite_get
+from .http_cache import make_session, conditional_headers, cached_page
+from .parser import ResultTableParser
+from .filters import compile_filters, filter_for
+from .scheduler import due_searches, updated_change_rate
+from .report import RunReport
+from .notify import queue_digest, send_outbox
+from .stats import RunStats, SearchStats, write_metrics
+
+# Retrieval tuning: number of concurrent fetches, and the per-host request
+# rate (requests per second) / burst / random extra delay (seconds) the rate
+# limiter allows.
+RETRIEVE_WORKERS = 4
+REQUESTS_PER_SECOND = 1.0
+REQUEST_BURST = 1
+REQUEST_JITTER = 0.5
+
+# Result pages: rows per page, the URL parameter that selects a page, and
+# how many pages one search may walk in a run.
+PAGE_SIZE = 100
+PAGE_PARAM = 'p'
+MAX_PAGES = 20
+
+# A search gets a full sweep (every page, deletions included) this often;
+# other runs only walk pages until one has nothing new on it.
+FULL_SWEEP_DAYS = 7
+
+def parse_page(html, row_filter=None):
+    # Returns (rows kept by row_filter, rows on the page before filtering),
+    # or (None, 0) when the page has no result table
+    parser = ResultTableParser(row_filter)
+    rows = list(parser.iter_rows(html))
+    if not parser.found:
+        return None, 0
+    return rows, parser.row_count
+
+def reconcile_rows(conn, search_id, rows, delete_missing=True, db_items=None, stats=None):
+    # Reconcile on the stored ItemKey (a digest of the normalized Subject,
+    # Poster and ItemGroup, see db/database_operations/normalize.py), so a
+    # repost with a different part counter or size matches the item
+    # already in FoundList. db_items are (id, ItemKey) pairs.
+    # New rows are written to FoundList; ids of database rows missing from
+    # `rows` are returned (not deleted) when delete_missing is set.
+    # stats (a SearchStats) gets the time spent writing.
+    delta_list = []
+    items_to_delete = []
+    if db_items is None:
+        db_items = db_get_found_item_keys(conn, search_id)
+    db_keys = {db_key for _, db_key in db_items}
+
+    # Items in the database but no longer on the website
+    if delete_missing:
+        site_keys = {item_key(row.Subject, row.Poster, row.ItemGroup) for row in rows}
+        for item_id, db_key in db_items:
+            if db_key not in site_keys:
+                items_to_delete.append(item_id)
+
+    # Items on the website that aren't in the database yet
+    new_items = []
+    for row in rows:
+        key = item_key(row.Subject, row.Poster, row.ItemGroup)
+        if key not in db_keys:
+            # FoundList holds each item once, so skip repeats on the page
+            db_keys.add(key)
+            new_items.append((row.ItemIndex, row.Subject, row.Poster, row.ItemGroup, row.Age))
+
+            # Add the item to the delta_list
+            delta_list.append({
+                'ItemIndex': row.ItemIndex,
+                'Subject': row.Subject,
+                'Poster': row.Poster,
+                'ItemGroup': row.ItemGroup,
+                'Age': row.Age
+            })
+
+    # Add the new items to the database in one transaction
+    if new_items:
+        start = time.perf_counter()
+        db_add_found_items(conn, search_id, new_items)
+        if stats is not None:
+            stats.db_seconds += time.perf_counter() - start
+
+    return delta_list, items_to_delete
+
+def get_url_data(conn, url, search_id, search_string, html=None, session=None, limiter=None):
+    # Compare a single result page to the database. The page can be passed
+    # in already fetched, otherwise it is fetched through polite_get, on the
+    # caller's session and rate limiter if given (a throwaway session and
+    # the default rate otherwise).
+    if html is None:
+        own_session = session is None
+        if own_session:
+            session = make_session(1)
+        if limiter is None:
+            limiter = HostRateLimiter(rate=REQUESTS_PER_SECOND, burst=REQUEST_BURST, jitter=REQUEST_JITTER)
+        try:
+            html = polite_get(url, limiter, session=session).text
+        finally:
+            if own_session:
+                session.close()
+    row_filter = filter_for(compile_filters(db_get_filter_rules(conn)), search_id)
+    rows, _ = parse_page(html, row_filter)
+    if rows is None:
+        return [], []
+
+    # Return both delta_list and items_to_delete
+    return reconcile_rows(conn, search_id, rows)
+
+def get_url(search_string, page=1):
+    # Converts 'Piers Anthony epub' to
+    # 'https://binsearch.info/?q=Piers+Anthony+epub&max=100&adv_age=1100&server='
+    # Later result pages get a page number appended.
+
+    # Split the search string into individual words and join them with '+'
+    search_query = "+".join(search_string.split())
+
+    # Construct the URL
+    url = f"https://binsearch.info/?q={search_query}&max={PAGE_SIZE}&adv_age=1100&server="
+    if page > 1:
+        url += f"&{PAGE_PARAM}={page}"
+    return url
+
+def fetch_search_page(url, limiter, session=None, cached=None):
+    # Runs on a worker thread: only network I/O happens here, the database
+    # is touched from the calling thread. Sends the cached validators and
+    # reports pages that haven't changed since the last run.
+    response = polite_get(url, limiter, session=session, headers=conditional_headers(cached))
+    return cached_page(response, cached)
+
+class SearchCrawl:
+    # Progress of one search string through its result pages
+    __slots__ = ('search_string', 'search_id', 'full_sweep', 'change_rate', 'row_filter', 'stats',
+                 'posted_after', 'page', 'rows', 'db_items', 'known_keys', 'end', 'first_page')
+
+    def __init__(self, search_string, search_id, full_sweep, change_rate=None, row_filter=None, stats=None,
+                 posted_after=None):
+        self.search_string = search_string
+        self.search_id = search_id
+        self.full_sweep = full_sweep
+        self.change_rate = change_rate
+        self.row_filter = row_filter
+        self.stats = stats or SearchStats(search_id, search_string)
+        self.posted_after = posted_after  # rows posted earlier are ignored (retention)
+        self.page = 1
+        self.rows = []
+        self.db_items = None
+        self.known_keys = None
+        # Why the crawl stopped: 'last_page' (a short page, so every result
+        # was seen), 'max_pages' (the cap), 'no_table' (a page without a
+        # result table) or 'no_new' (an incremental crawl caught up)
+        self.end = None
+        self.first_page = None
+
+def crawl_page(conn, crawl, page, max_pages=MAX_PAGES):
+    # Take in one fetched result page; returns True if the next page
+    # should be fetched. Pages are newest first, so an incremental crawl
+    # stops at the first page that has nothing new on it.
+    stats = crawl.stats
+    if crawl.page == 1:
+        crawl.first_page = page
+        start = time.perf_counter()
+        crawl.db_items = db_get_found_item_keys(conn, crawl.search_id)
+        stats.db_seconds += time.perf_counter() - start
+        crawl.known_keys = {db_key for _, db_key in crawl.db_items}
+
+    # Filtered rows never leave the parser; whether there is a next page
+    # still depends on how many rows the page had
+    start = time.perf_counter()
+    rows, row_count = parse_page(page.text, crawl.row_filter)
+    stats.parse_seconds += time.perf_counter() - start
+    if rows is None:
+        crawl.end = 'no_table'
+        return False
+    stats.rows_parsed += row_count
+    page_full = row_count >= PAGE_SIZE
+    if crawl.posted_after is not None:
+        # Older than the retention period: would only be pruned again.
+        # Rows whose age can't be parsed are kept.
+        now = time.time()
+        rows = [row for row in rows if (parse_age(row.Age, now) or crawl.posted_after) >= crawl.posted_after]
+
+    crawl.rows.extend(rows)
+    start = time.perf_counter()
+    has_new = any(item_key(row.Subject, row.Poster, row.ItemGroup) not in crawl.known_keys for row in rows)
+    stats.diff_seconds += time.perf_counter() - start
+
+    if not page_full:
+        crawl.end = 'last_page'
+    elif crawl.page >= max_pages:
+        crawl.end = 'max_pages'
+    elif not (crawl.full_sweep or has_new):
+        crawl.end = 'no_new'
+    else:
+        return True
+    return False
+
+def finish_crawl(conn, crawl):
+    # Apply everything collected for one search. Deletions only happen on a
+    # full sweep that reached the real last page: an incremental crawl, one
+    # cut off by max_pages and one that got a page without a result table
+    # (an error or throttle page) haven't seen every item, so items they
+    # missed must not be taken for gone.
+    stats = crawl.stats
+    start = time.perf_counter()
+    db_seconds = stats.db_seconds
+    search_delta, items_to_delete = reconcile_rows(conn, crawl.search_id, crawl.rows,
+                                                   delete_missing=crawl.full_sweep and crawl.end == 'last_page',
+                                                   db_items=crawl.db_items, stats=stats)
+    # Time spent inserting was already counted as database time
+    stats.diff_seconds += time.perf_counter() - start - (stats.db_seconds - db_seconds)
+    stats.added = len(search_delta)
+    stats.deleted = len(items_to_delete)
+
+    start = time.perf_counter()
+    # Remove items from the database no longer on the website
+    if items_to_delete:
+        db_remove_item_list(conn, crawl.search_id, items_to_delete)
+    # A sweep broken off by a bad page is retried next run; one that hit
+    # the page cap has done all it can
+    if crawl.full_sweep and not (crawl.end == 'no_table' and crawl.page > 1):
+        db_set_full_sweep(conn, crawl.search_id, int(time.time()))
+
+    # Only remember the first page once it has been applied
+    first_page = crawl.first_page
+    db_set_response_cache(conn, get_url(crawl.search_string), first_page.etag,
+                          first_page.last_modified, first_page.content_hash)
+    stats.db_seconds += time.perf_counter() - start
+    return search_delta, items_to_delete
+
+def record_check(conn, crawl, changed):
+    # Feed the outcome of this check into the search's change rate
+    start = time.perf_counter()
+    db_record_search_check(conn, crawl.search_id, int(time.time()), changed,
+                           updated_change_rate(crawl.change_rate, changed))
+    crawl.stats.db_seconds += time.perf_counter() - start
+
+def retrieve_search_items(workers=RETRIEVE_WORKERS, rate=REQUESTS_PER_SECOND, burst=REQUEST_BURST,
+                          jitter=REQUEST_JITTER, use_cache=True,
+                          max_pages=MAX_PAGES, full_sweep_days=FULL_SWEEP_DAYS, force_full_sweep=False,
+                          search_strings=None, progress=None, schedule=True, max_searches=None,
+                          conn=None, session=None, stop_event=None, log_formats=('text',), email_format='text',
+                          send_email=True, digest=True, metrics_file=None, retention_days=None):
+    # search_strings limits the run to those entries (default: all of them).
+    # With schedule set only the searches the scheduler says are due are
+    # checked, at most max_searches of them, most volatile first.
+    # progress, if given, is called as progress(done, total, search_string)
+    # each time a search finishes; it runs on the calling thread.
+    # conn/session let a long-running caller (the daemon) keep them warm
+    # between runs; when stop_event is set no new searches are started and
+    # the run ends once the ones in flight are done.
+    # log_formats/email_format pick the report renderers (text, html, jsonl).
+    # The digest is queued in the outbox unless digest is False (shard
+    # workers leave it to whoever finishes the run); send_email also
+    # delivers it.
+    # Per-search and per-stage statistics are stored in RunHistory /
+    # SearchRunStats, and exported to metrics_file (Prometheus text) if set.
+    # With retention_days, results posted longer ago than that are ignored
+    # and older items are pruned from FoundList at the end of the run.
+    # Returns the per-search additions and the error log.
+    master_dict = {}
+    error_log = []
+    run_stats = RunStats()
+    timestamp = datetime.now().strftime('%Y-%m-%d %I:%M:%S %p PST')
+
+    # Iterate through all the SearchList items and
+    # go to binsearch.info to get the latest. The connection is opened
+    # here unless one is passed in, so a run can be started from any thread.
+    own_conn = conn is None
+    if own_conn:
+        conn = db_connect()
+    search_entries = db_get_search_entries(conn)
+    if search_strings is not None:
+        wanted = set(search_strings)
+        search_entries = [entry for entry in search_entries if entry[1] in wanted]
+    if schedule:
+        search_entries = due_searches(search_entries, time.time(), max_searches)
+    elif max_searches is not None:
+        search_entries = search_entries[:max_searches]
+    response_cache = db_get_response_cache(conn) if use_cache else {}
+    row_filters = compile_filters(db_get_filter_rules(conn))
+    sweep_before = time.time() - full_sweep_days * 86400
+    posted_after = int(time.time() - retention_days * 86400) if retention_days is not None else None
+
+    # Pages are fetched concurrently over one keep-alive session, politeness
+    # comes from the per-host rate limiter. Pages of one search are fetched
+    # one after another; parsing and database updates stay on this thread.
+    # Searches are handed to the pool a few at a time so a stop request only
+    # has to wait for those.
+    limiter = HostRateLimiter(rate=rate, burst=burst, jitter=jitter)
+    own_session = session is None
+    if own_session:
+        session = make_session(workers)
+    queued = deque(search_entries)
+    in_flight = max(1, workers) * 2
+
+    # Each search's additions are written to the log as soon as it finishes
+    report = RunReport(timestamp, log_formats, email_format)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            pending = {}
+
+            def submit(crawl):
+                url = get_url(crawl.search_string, crawl.page)
+                # A full sweep must see every page, so it never trusts the cache
+                cached = response_cache.get(url) if crawl.page == 1 and not crawl.full_sweep else None
+                pending[executor.submit(fetch_search_page, url, limiter, session, cached)] = crawl
+
+            def top_up():
+                if stop_event is not None and stop_event.is_set():
+                    queued.clear()
+                while queued and len(pending) < in_flight:
+                    search_id, search_string, last_full_sweep, _, _, change_rate = queued.popleft()
+                    full_sweep = force_full_sweep or (last_full_sweep or 0) <= sweep_before
+                    submit(SearchCrawl(search_string, search_id, full_sweep, change_rate,
+                                       filter_for(row_filters, search_id),
+                                       run_stats.search(search_id, search_string), posted_after))
+
+            top_up()
+            finished = 0
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    crawl = pending.pop(future)
+                    try:
+                        page = future.result()
+                        crawl.stats.pages += 1
+                        crawl.stats.bytes += page.size
+                        crawl.stats.fetch_seconds += page.elapsed
+                        # page.unchanged: same first page as last run, nothing
+                        # to parse or diff
+                        if page.unchanged:
+                            crawl.stats.unchanged = True
+                            record_check(conn, crawl, False)
+                        else:
+                            if crawl_page(conn, crawl, page, max_pages):
+                                crawl.page += 1
+                                submit(crawl)
+                                continue
+
+                            search_delta, items_to_delete = finish_crawl(conn, crawl)
+                            record_check(conn, crawl, bool(search_delta or items_to_delete))
+                            if search_delta:
+                                master_dict[crawl.search_string] = search_delta
+                                report.add(crawl.search_string, search_delta)
+                    except Exception as e:
+                        crawl.stats.error = str(e)
+                        error_log.append(f"Error for '{crawl.search_string}': {str(e)}")
+
+                    finished += 1
+                    if progress:
+                        progress(finished, len(search_entries), crawl.search_string)
+                top_up()
+
+        if posted_after is not None:
+            db_prune_found_items(conn, posted_after)
+
+        # Queue this run's digest in the outbox, then deliver whatever is
+        # pending (earlier failures included) over one SMTP connection
+        start = time.perf_counter()
+        if digest and report.sections:
+            queue_digest(conn, f"NNTP deltas {timestamp}", report)
+        if send_email:
+            send_outbox(conn)
+        run_stats.email_seconds = time.perf_counter() - start
+    finally:
+        report.close()
+        run_stats.finish()
+        db_add_run_history(conn, run_stats.row(), [search_stats.row() for search_stats in run_stats.searches])
+        if metrics_file:
+            write_metrics(metrics_file, run_stats)
+        if own_session:
+            session.close()
+        # Close the database connection
+        if own_conn:
+            conn.close()
+
+    return master_dict, error_log
@@ -0,0 +1,49 @@
+# retrieval/scheduler.py
+#
+# Decides which search strings are due in a run. Each search keeps a rolling
+# change rate (the share of recent checks that found something new or
+# removed); volatile searches are checked every run, dormant ones back off
+# to MAX_CHECK_HOURS, and the most volatile due searches go first when a run
+# has a cap on how many it may check.
+
+# A search that changes on every check is due again after this long
+MIN_CHECK_HOURS = 20
+# ...and none waits longer than this, however quiet it is
+MAX_CHECK_HOURS = 14 * 24
+
+# Weight of the newest check in the rolling change rate
+CHANGE_RATE_ALPHA = 0.3
+# Floor for the change rate when working out the interval
+MIN_CHANGE_RATE = 0.02
+
+
+def check_interval(change_rate):
+    # Seconds between checks for a search with this change rate
+    rate = max(change_rate if change_rate is not None else 1.0, MIN_CHANGE_RATE)
+    return min(MIN_CHECK_HOURS / rate, MAX_CHECK_HOURS) * 3600
+
+
+def updated_change_rate(change_rate, changed):
+    if change_rate is None:
+        change_rate = 1.0
+    return CHANGE_RATE_ALPHA * (1.0 if changed else 0.0) + (1 - CHANGE_RATE_ALPHA) * change_rate
+
+
+def due_searches(entries, now, max_searches=None):
+    # entries are db_get_search_entries rows. Returns the due ones, never
+    # checked first, then by change rate and how overdue they are.
+    due = []
+    for entry in entries:
+        last_checked, change_rate = entry[3], entry[5]
+        if last_checked is None:
+            due.append(((0, 0.0, 0.0), entry))
+            continue
+        overdue = (now - last_checked) / check_interval(change_rate)
+        if overdue >= 1:
+            due.append(((1, -(change_rate or 0.0), -overdue), entry))
+
+    due.sort(key=lambda item: item[0])
+    entries = [entry for _, entry in due]
+    if max_searches is not None:
+        entries = entries[:max_searches]
+    return entries
@@ -0,0 +1,141 @@
+# retrieval/shard.py
+#
+# Sharded retrieval: several worker processes on one machine work through
+# one run's search list. The database is in WAL mode, whose shared-memory
+# index only works between processes on the same host, so every worker of a
+# run must open the database file locally, not over a network filesystem.
+#
+#   BookSearch.py --shard nightly-2026-10-18    (start as many as wanted)
+#
+# The first worker to join a run snapshots the due searches into
+# SearchLeases. Every worker then claims a batch at a time with a lease that
+# it renews while it works; a worker that dies stops renewing, its lease
+# expires and the searches go back to the pool. Each batch's additions are
+# stored in RunDeltas, and the worker that finds the run complete renders
+# the one report and queues the one digest for the whole run.
+#
+# A batch whose worker dies after applying some searches is redone by the
+# next worker; those searches' additions are already in FoundList and so
+# are missing from the digest. Keep batches small to keep that window small.
+
+from datetime import datetime
+import os
+import signal
+import socket
+import threading
+import time
+
+from db.database_operations import (
+    Database,
+    db_get_search_entries,
+    db_create_shard_run,
+    db_get_shard_run,
+    db_iter_run_deltas,
+)
+from .http_cache import make_session
+from .scheduler import due_searches
+from .report import RunReport
+from .notify import queue_digest, send_outbox
+from .retrieval import retrieve_search_items, RETRIEVE_WORKERS
+
+SHARD_BATCH_SIZE = 10
+LEASE_SECONDS = 10 * 60
+IDLE_POLL_SECONDS = 5  # wait while other workers hold the remaining leases
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def join_shard_run(conn, run_id, schedule=True, max_searches=None):
+    # Create the run's work list unless another worker already has.
+    # Returns the run's report timestamp.
+    run = db_get_shard_run(conn, run_id)
+    if run is None:
+        search_entries = db_get_search_entries(conn)
+        if schedule:
+            search_entries = due_searches(search_entries, time.time(), max_searches)
+        elif max_searches is not None:
+            search_entries = search_entries[:max_searches]
+        timestamp = datetime.now().strftime('%Y-%m-%d %I:%M:%S %p PST')
+        db_create_shard_run(conn, run_id, timestamp, [entry[0] for entry in search_entries])
+        run = db_get_shard_run(conn, run_id)
+    return run[0]
+
+
+def finish_shard_run(conn, run_id, timestamp, log_formats=('text',), email_format='text', send_email=True):
+    # Render the consolidated report from every worker's RunDeltas
+    report = RunReport(timestamp, log_formats, email_format)
+    try:
+        for search_string, delta_list in db_iter_run_deltas(conn, run_id):
+            report.add(search_string, delta_list)
+        if report.sections:
+            queue_digest(conn, f"NNTP deltas {timestamp}", report)
+    finally:
+        report.close()
+    if send_email:
+        send_outbox(conn)
+    return report.sections
+
+
+def run_shard_worker(run_id, worker=None, batch_size=SHARD_BATCH_SIZE, lease_seconds=LEASE_SECONDS,
+                     workers=RETRIEVE_WORKERS, schedule=True, max_searches=None, log_formats=('text',),
+                     email_format='text', send_email=True, stop_event=None, **retrieve_options):
+    # Claim and retrieve batches of run_id's searches until none are left.
+    # Returns (searches retrieved by this worker, error log).
+    worker = worker or default_worker_name()
+    if stop_event is None:
+        # SIGTERM / SIGINT: finish the searches in flight, then exit
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    error_log = []
+    retrieved = 0
+
+    database = Database()
+    conn = database.connection()
+    session = make_session(workers)
+    try:
+        timestamp = join_shard_run(conn, run_id, schedule, max_searches)
+        names = {entry[0]: entry[1] for entry in database.iter_search_entries()}
+
+        while not stop_event.is_set():
+            now = int(time.time())
+            search_ids = database.claim_leases(run_id, worker, batch_size, now + lease_seconds, now)
+            if not search_ids:
+                if not database.count_pending_leases(run_id):
+                    break
+                # Everything left is leased by live workers; wait in case
+                # one of them dies and its lease expires
+                stop_event.wait(IDLE_POLL_SECONDS)
+                continue
+
+            renewed = [time.time()]
+
+            def renew_leases(done, total, search_string):
+                # Runs after each search; keeps the batch's leases alive
+                if time.time() - renewed[0] > lease_seconds / 3:
+                    renewed[0] = time.time()
+                    database.renew_leases(run_id, worker, int(renewed[0]) + lease_seconds)
+
+            search_strings = [names[search_id] for search_id in search_ids if search_id in names]
+            master_dict, batch_errors = retrieve_search_items(
+                workers=workers, search_strings=search_strings, schedule=False, conn=conn, session=session,
+                stop_event=stop_event, progress=renew_leases, log_formats=(), send_email=False, digest=False,
+                **retrieve_options)
+            error_log.extend(batch_errors)
+            if stop_event.is_set():
+                # Stopped part way: keep what was found for the digest but
+                # let the leases expire, so another worker redoes the batch
+                database.complete_leases(run_id, worker, [], master_dict, int(time.time()))
+                break
+            database.complete_leases(run_id, worker, search_ids, master_dict, int(time.time()))
+            retrieved += len(search_ids)
+
+        if not stop_event.is_set() and database.finish_shard_run(run_id, int(time.time())):
+            finish_shard_run(conn, run_id, timestamp, log_formats, email_format, send_email)
+    finally:
+        session.close()
+        database.close()
+
+    return retrieved, error_log
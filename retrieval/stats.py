@@ -0,0 +1,114 @@
+# retrieval/stats.py
+#
+# Run instrumentation. Every search checked gets a SearchStats with its
+# pages, bytes, rows parsed, adds/deletes, errors and the time spent in
+# each stage:
+#
+#   fetch  server latency of its page requests (rate-limit waits excluded)
+#   parse  result-table parsing and filtering
+#   diff   reconciling rows against FoundList, in memory
+#   db     every database read and write for the search
+#
+# The run adds its email time (queueing and sending the digest) and wall
+# time. Both are stored in RunHistory / SearchRunStats at the end of the
+# run; write_metrics() also exports the run as a Prometheus text file.
+
+import os
+import time
+
+METRICS_FILE = 'bin/booksearch.prom'
+PROFILE_FILE = 'bin/retrieve.prof'
+
+STAGES = ('fetch', 'parse', 'diff', 'db')
+
+
+class SearchStats:
+    __slots__ = ('search_id', 'search_string', 'pages', 'bytes', 'rows_parsed', 'added', 'deleted',
+                 'unchanged', 'fetch_seconds', 'parse_seconds', 'diff_seconds', 'db_seconds', 'error')
+
+    def __init__(self, search_id, search_string):
+        self.search_id = search_id
+        self.search_string = search_string
+        self.pages = 0
+        self.bytes = 0
+        self.rows_parsed = 0
+        self.added = 0
+        self.deleted = 0
+        self.unchanged = False
+        self.fetch_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.diff_seconds = 0.0
+        self.db_seconds = 0.0
+        self.error = None
+
+    def row(self):
+        # SearchRunStats columns after run_id
+        return (self.search_id, self.pages, self.bytes, self.rows_parsed, self.added, self.deleted,
+                int(self.unchanged), self.fetch_seconds, self.parse_seconds, self.diff_seconds,
+                self.db_seconds, self.error)
+
+
+class RunStats:
+    def __init__(self):
+        self.started_at = int(time.time())
+        self.start = time.perf_counter()
+        self.total_seconds = 0.0
+        self.email_seconds = 0.0
+        self.searches = []
+
+    def search(self, search_id, search_string):
+        search_stats = SearchStats(search_id, search_string)
+        self.searches.append(search_stats)
+        return search_stats
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self.start
+
+    def total(self, field):
+        return sum(getattr(search_stats, field) for search_stats in self.searches)
+
+    @property
+    def errors(self):
+        return sum(1 for search_stats in self.searches if search_stats.error)
+
+    def row(self):
+        # RunHistory columns after id
+        return (self.started_at, self.total_seconds, len(self.searches), self.total('pages'),
+                self.total('bytes'), self.total('rows_parsed'), self.total('added'), self.total('deleted'),
+                self.errors, self.total('fetch_seconds'), self.total('parse_seconds'),
+                self.total('diff_seconds'), self.total('db_seconds'), self.email_seconds)
+
+
+def write_metrics(path, run_stats):
+    # Prometheus text exposition format (for node_exporter's textfile
+    # collector); written to a temp file and renamed so it is never read
+    # half-written
+    lines = [
+        "# HELP booksearch_run_timestamp_seconds Start of the last retrieval run.",
+        "# TYPE booksearch_run_timestamp_seconds gauge",
+        f"booksearch_run_timestamp_seconds {run_stats.started_at}",
+        "# HELP booksearch_run_duration_seconds Wall time of the last retrieval run.",
+        "# TYPE booksearch_run_duration_seconds gauge",
+        f"booksearch_run_duration_seconds {run_stats.total_seconds:.6f}",
+        "# HELP booksearch_stage_seconds Time spent per stage in the last run, summed over searches.",
+        "# TYPE booksearch_stage_seconds gauge",
+    ]
+    for stage in STAGES:
+        lines.append(f'booksearch_stage_seconds{{stage="{stage}"}} {run_stats.total(stage + "_seconds"):.6f}')
+    lines.append(f'booksearch_stage_seconds{{stage="email"}} {run_stats.email_seconds:.6f}')
+    for name, value, description in (
+            ('searches', len(run_stats.searches), 'Searches checked'),
+            ('pages', run_stats.total('pages'), 'Result pages fetched'),
+            ('bytes', run_stats.total('bytes'), 'Response bytes received'),
+            ('rows_parsed', run_stats.total('rows_parsed'), 'Result rows parsed'),
+            ('items_added', run_stats.total('added'), 'Items added'),
+            ('items_deleted', run_stats.total('deleted'), 'Items deleted'),
+            ('errors', run_stats.errors, 'Searches that failed')):
+        lines.append(f"# HELP booksearch_run_{name} {description} in the last run.")
+        lines.append(f"# TYPE booksearch_run_{name} gauge")
+        lines.append(f"booksearch_run_{name} {value}")
+
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as metrics_file:
+        metrics_file.write("\n".join(lines) + "\n")
+    os.replace(temp_file, path)
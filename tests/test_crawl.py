@@ -0,0 +1,72 @@
+# tests/test_crawl.py
+#
+# Full sweeps only delete items once they have seen the real last page.
+
+import pytest
+
+from bench.harness import synthetic_page
+from db.database_operations import db_add_search_string, db_get_search_string_id, db_get_entry_count
+from retrieval.http_cache import PageResponse, content_hash
+from retrieval.retrieval import SearchCrawl, crawl_page, finish_crawl
+
+THROTTLE_PAGE = "<html><body><p>Too many requests, slow down.</p></body></html>"
+
+
+def page(text):
+    body = text.encode('utf-8')
+    return PageResponse(False, text, None, None, content_hash(body), len(body))
+
+
+def result_page(rows, seed):
+    return page(synthetic_page(f"page {seed}", rows, seed).decode('utf-8'))
+
+
+def sweep(conn, search_id, pages, max_pages=20):
+    # What retrieve_search_items does with one search's pages
+    crawl = SearchCrawl('books', search_id, full_sweep=True)
+    for fetched in pages:
+        if not crawl_page(conn, crawl, fetched, max_pages):
+            break
+        crawl.page += 1
+    return finish_crawl(conn, crawl)
+
+
+def last_full_sweep(conn, search_id):
+    return conn.execute("SELECT last_full_sweep FROM SearchList WHERE id=?", (search_id,)).fetchone()[0]
+
+
+@pytest.fixture
+def search_id(conn):
+    # 240 items stored from a 100/100/40 result set
+    db_add_search_string(conn, 'books')
+    search_id = db_get_search_string_id(conn, 'books')
+    added, deleted = sweep(conn, search_id, [result_page(100, 1), result_page(100, 2), result_page(40, 3)])
+    assert (len(added), len(deleted)) == (240, 0)
+    conn.execute("UPDATE SearchList SET last_full_sweep=NULL")
+    conn.commit()
+    return search_id
+
+
+def test_sweep_to_the_last_page_deletes_missing_items(conn, search_id):
+    # Page 3's items are gone, replaced by a short page of others
+    added, deleted = sweep(conn, search_id, [result_page(100, 1), result_page(100, 2), result_page(10, 4)])
+    assert (len(added), len(deleted)) == (10, 40)
+    assert db_get_entry_count(conn, search_id) == 210
+    assert last_full_sweep(conn, search_id)
+
+
+def test_sweep_cut_off_by_max_pages_keeps_later_items(conn, search_id):
+    added, deleted = sweep(conn, search_id, [result_page(100, 1), result_page(100, 2), result_page(40, 3)],
+                           max_pages=2)
+    assert (len(added), len(deleted)) == (0, 0)
+    assert db_get_entry_count(conn, search_id) == 240
+    # Nothing more a sweep could do, so it isn't retried every run
+    assert last_full_sweep(conn, search_id)
+
+
+def test_page_without_table_skips_deletions(conn, search_id):
+    added, deleted = sweep(conn, search_id, [result_page(100, 1), page(THROTTLE_PAGE), result_page(40, 3)])
+    assert (len(added), len(deleted)) == (0, 0)
+    assert db_get_entry_count(conn, search_id) == 240
+    # The sweep is retried next run
+    assert last_full_sweep(conn, search_id) is None
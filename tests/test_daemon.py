@@ -0,0 +1,62 @@
+# tests/test_daemon.py
+#
+# SIGHUP lets the in-flight search finish, queues nothing more and starts
+# the next cycle straight away; SIGTERM stops the daemon.
+
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from db.database_operations import database_operations
+from retrieval import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, 'SIGHUP'), reason="needs SIGHUP")
+
+
+class Session:
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def handlers():
+    # run_daemon installs its own handlers; put pytest's back afterwards
+    saved = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)}
+    yield
+    for signum, handler in saved.items():
+        signal.signal(signum, handler)
+
+
+def test_sighup_finishes_the_search_and_starts_the_next_cycle(database_path, tmp_path, monkeypatch, handlers):
+    cycles = []
+
+    def retrieve_search_items(workers, conn, session, stop_event, progress, **options):
+        # Five searches queued; the signal arrives while the first is running
+        done = 0
+        for search_string in ['a', 'b', 'c', 'd', 'e']:
+            if stop_event.is_set():
+                break
+            if done == 0:
+                os.kill(os.getpid(), signal.SIGHUP if not cycles else signal.SIGTERM)
+            done += 1
+            progress(done, 5, search_string)
+        cycles.append(done)
+        return [], []
+
+    monkeypatch.setattr(database_operations, 'database_path', database_path)
+    monkeypatch.setattr(daemon, 'make_session', lambda workers: Session())
+    monkeypatch.setattr(daemon, 'retrieve_search_items', retrieve_search_items)
+
+    status_file = str(tmp_path / 'status.json')
+    started = time.time()
+    daemon.run_daemon(interval=3600, status_file=status_file, workers=1)
+
+    assert cycles == [1, 1]
+    assert time.time() - started < 60
+    with open(status_file, encoding='utf-8') as json_file:
+        status = json.load(json_file)
+    assert status['state'] == 'stopped'
+    assert status['cycle'] == 2
@@ -0,0 +1,106 @@
+# tests/test_found_cache.py
+
+import pytest
+
+from db.database_operations import (db_connect, db_add_search_string, db_add_search_strings,
+                                    db_get_search_string_id, db_add_found_items, db_remove_search_string)
+from gui.found_cache import FoundItemsCache, rows_size
+
+
+def items(count, start=0):
+    return [(index, f'Book {index}', 'poster@usenet.org', 'alt.binaries.ebook', '1d')
+            for index in range(start, start + count)]
+
+
+@pytest.fixture
+def other(database_path):
+    # A second connection, standing in for the refresh worker or another process
+    other = db_connect(database_path)
+    yield other
+    other.close()
+
+
+def add_search(conn, search_string, count):
+    db_add_search_string(conn, search_string)
+    search_id = db_get_search_string_id(conn, search_string)
+    db_add_found_items(conn, search_id, items(count))
+    return search_id
+
+
+def traced(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_unchanged_database_needs_no_query(conn):
+    add_search(conn, 'a', 3)
+    cache = FoundItemsCache()
+    search_id, generation, rows = cache.get(conn, 'a')
+    assert len(rows) == 3
+
+    statements = traced(conn)
+    assert cache.get(conn, 'a') == (search_id, generation, rows)
+    assert statements == ["PRAGMA data_version"]
+
+
+def test_write_through_another_connection_reloads(conn, other):
+    search_id = add_search(conn, 'a', 3)
+    cache = FoundItemsCache()
+    _, generation, rows = cache.get(conn, 'a')
+
+    db_add_found_items(other, search_id, items(2, start=3))
+    _, new_generation, new_rows = cache.get(conn, 'a')
+    assert new_generation > generation
+    assert len(new_rows) == 5
+
+
+def test_unrelated_write_keeps_the_rows(conn, other):
+    add_search(conn, 'a', 3)
+    cache = FoundItemsCache()
+    _, generation, rows = cache.get(conn, 'a')
+
+    # Moves data_version, but not this search's generation
+    db_add_search_strings(other, ['b'])
+    statements = traced(conn)
+    _, same_generation, same_rows = cache.get(conn, 'a')
+    assert same_generation == generation and same_rows is rows
+    assert not any('FoundList' in statement for statement in statements)
+
+    # The entry took the new token, so the next get is a hit again
+    statements.clear()
+    cache.get(conn, 'a')
+    assert statements == ["PRAGMA data_version"]
+
+
+def test_evicts_least_recently_used_by_size(conn):
+    for search_string in ['a', 'b', 'c']:
+        add_search(conn, search_string, 10)
+    cache = FoundItemsCache()
+    size = rows_size(cache.get(conn, 'a')[2])
+
+    cache = FoundItemsCache(max_bytes=2 * size)
+    cache.get(conn, 'a')
+    cache.get(conn, 'b')
+    cache.get(conn, 'a')
+    cache.get(conn, 'c')
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.size == 2 * size
+
+    # Bigger than the whole cache: returned but not kept
+    small = FoundItemsCache(max_bytes=size - 1)
+    assert len(small.get(conn, 'a')[2]) == 10
+    assert not small.entries and small.size == 0
+
+
+def test_removed_search_is_discarded(conn, other):
+    add_search(conn, 'a', 3)
+    add_search(conn, 'b', 3)
+    cache = FoundItemsCache()
+    cache.get(conn, 'a')
+    cache.get(conn, 'b')
+
+    db_remove_search_string(other, 'a')
+    assert cache.get(conn, 'a') is None
+    assert list(cache.entries) == ['b']
+    assert cache.size == rows_size(cache.entries['b'][2])
@@ -0,0 +1,90 @@
+# tests/test_normalize.py
+
+import json
+
+import pytest
+
+from db.database_operations import (db_add_search_string, db_get_search_string_id, db_add_found_items,
+                                    db_get_found_items, db_rekey_found_items)
+from db.database_operations.normalize import DEFAULT_RULES, load_rules, normalize_subject, item_key
+
+
+@pytest.mark.parametrize('subject, expected', [
+    ('"Dan Brown - Inferno.epub" yEnc (1/4) 4779K', 'dan brown - inferno.epub'),
+    ('[03/12] - "Dan Brown - Inferno.epub" yEnc (01/04) 4.7 MB', 'dan brown - inferno.epub'),
+    ('"Piers Anthony - Xanth 01.epub" (01 of 12) 800 KB', 'piers anthony - xanth 01.epub'),
+    ('"Robin Hobb - Assassin.mobi" yEnc 1,2 GiB', 'robin hobb - assassin.mobi'),
+    ('"Culture.pdf" 123456 bytes', 'culture.pdf'),
+])
+def test_reposts_normalize_alike(subject, expected):
+    assert normalize_subject(subject) == expected
+
+
+@pytest.mark.parametrize('subject, expected', [
+    # Title text that only looks like a size
+    ('Warhammer 40k - Horus Rising', 'warhammer 40k - horus rising'),
+    ('Book 5 T', 'book 5 t'),
+    ('Catch 22 - Joseph Heller', 'catch 22 - joseph heller'),
+    ('2001 A Space Odyssey', '2001 a space odyssey'),
+    ('Stephen King - 11.22.63', 'stephen king - 11.22.63'),
+])
+def test_title_text_is_kept(subject, expected):
+    assert normalize_subject(subject) == expected
+
+
+def test_item_key_ignores_repost_noise():
+    assert (item_key('"Dan Brown - Inferno.epub" yEnc (1/4) 4779K', 'poster', 'alt.binaries.ebook') ==
+            item_key('"Dan Brown - Inferno.epub" yEnc (02/04) 4.7 MB', 'Poster ', 'alt.binaries.ebook'))
+    assert item_key('Inferno.epub', 'poster', 'group') != item_key('Inferno.epub', 'other', 'group')
+
+
+def rules_file(tmp_path, text):
+    path = tmp_path / 'normalize_rules.json'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_load_rules_from_file(tmp_path):
+    rules = load_rules(rules_file(tmp_path, json.dumps([['foo', 'bar']])))
+    assert [(pattern.pattern, replacement) for pattern, replacement in rules] == [('foo', 'bar')]
+
+
+@pytest.mark.parametrize('text', [
+    '[["foo", ',                        # not JSON
+    '{"foo": "bar"}',                   # not a list
+    '[["foo"]]',                        # not a pair
+    '[["(unclosed", " "]]',             # pattern doesn't compile
+])
+def test_bad_rules_file_falls_back_to_defaults(tmp_path, capsys, text):
+    rules = load_rules(rules_file(tmp_path, text))
+    assert [(pattern.pattern, replacement) for pattern, replacement in rules] == \
+        [tuple(rule) for rule in DEFAULT_RULES]
+    assert 'Error' in capsys.readouterr().out
+
+
+def test_rekey_merges_items_the_rules_now_collapse(conn):
+    db_add_search_string(conn, 'inferno')
+    search_id = db_get_search_string_id(conn, 'inferno')
+    db_add_found_items(conn, search_id, [
+        (1, '"Dan Brown - Inferno.epub" yEnc (1/4) 4779K', 'poster', 'group', '1d'),
+        (2, 'Other Book', 'poster', 'group', '1d'),
+        (3, 'Third Book', 'poster', 'group', '1d'),
+    ])
+    first, second, third = [row[0] for row in sorted(db_get_found_items(conn, search_id))]
+    # As if stored under older rules: the repost has a key of its own, and
+    # the other two hold each other's keys
+    other_key = item_key('Other Book', 'poster', 'group')
+    third_key = item_key('Third Book', 'poster', 'group')
+    conn.execute("UPDATE FoundList SET ItemKey='old' WHERE id=?", (first,))
+    conn.execute("UPDATE FoundList SET ItemKey='swap' WHERE id=?", (second,))
+    conn.execute("UPDATE FoundList SET ItemKey=? WHERE id=?", (other_key, third))
+    conn.execute("UPDATE FoundList SET ItemKey=? WHERE id=?", (third_key, second))
+    conn.execute("INSERT INTO FoundList (search_id, ItemIndex, Subject, Poster, ItemGroup, Age, ItemKey) "
+                 "VALUES (?, 4, '[03/12] - \"Dan Brown - Inferno.epub\" yEnc (01/04) 4.7 MB', 'poster', 'group', "
+                 "'1d', 'repost')", (search_id,))
+    conn.commit()
+
+    assert db_rekey_found_items(conn)
+    rows = conn.execute("SELECT id, ItemKey FROM FoundList ORDER BY id").fetchall()
+    assert rows == [(first, item_key('"Dan Brown - Inferno.epub"', 'poster', 'group')),
+                    (second, other_key), (third, third_key)]
@@ -0,0 +1,136 @@
+# tests/test_notify.py
+
+from email import message_from_bytes
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import time
+
+import pytest
+
+from bench.harness import SMTPStub
+from db.database_operations import db_add_notifications
+from retrieval.notify import body_budget, batch_notifications, send_outbox, retry_after
+from retrieval.report import RunReport, HTML_START, HTML_END
+
+MAX_BYTES = 64 * 1024
+
+
+def deltas(search_number, count):
+    # Non-ASCII subjects, so the body is base64-encoded like a real digest
+    return [{'ItemIndex': index, 'Subject': f'Żółw {search_number}-{index} – “Tytuł” ' + 'x' * 80,
+             'Poster': 'poster@usenet.org', 'ItemGroup': 'alt.binaries.ebook', 'Age': '1d'}
+            for index in range(count)]
+
+
+def encoded_size(body, subtype):
+    # The message as send_outbox builds it
+    msg = MIMEMultipart()
+    msg['From'] = 'sender@example.com'
+    msg['To'] = 'recipient@example.com'
+    msg['Subject'] = 'NNTP deltas 2026-10-18 01:00:00 PM PST (part 10/10)'
+    msg.attach(MIMEText(body, subtype))
+    return len(msg.as_string().encode('utf-8'))
+
+
+@pytest.fixture
+def report():
+    # Email only: no log files
+    report = RunReport('2026-10-18 01:00:00 PM PST', (), 'html')
+    for search_number in range(40):
+        report.add(f'search {search_number}', deltas(search_number, 20))
+    # One search bigger than a whole message
+    report.add('huge search', deltas(99, 2000))
+    return report
+
+
+def test_html_parts_are_complete_documents(report):
+    bodies = report.email_bodies(body_budget(MAX_BYTES))
+    assert len(bodies) > 2
+    for body in bodies:
+        assert body.startswith(HTML_START) and body.endswith(HTML_END)
+        assert body.count('<html>') == 1
+        assert body.count('<table>') == body.count('</table>')
+        assert encoded_size(body, 'html') <= MAX_BYTES
+
+    # Every item is in exactly one part
+    rows = sum(body.count('<tr><td>') for body in bodies)
+    assert rows == 40 * 20 + 2000
+
+
+def test_text_parts_fit():
+    report = RunReport('2026-10-18 01:00:00 PM PST', (), 'text')
+    for search_number in range(40):
+        report.add(f'search {search_number}', deltas(search_number, 20))
+    bodies = report.email_bodies(body_budget(MAX_BYTES))
+    assert len(bodies) > 1
+    for body in bodies:
+        assert encoded_size(body, 'plain') <= MAX_BYTES
+
+
+def test_merged_html_digests_are_one_document(report):
+    small = RunReport('2026-10-18 02:00:00 PM PST', (), 'html')
+    small.add('search', deltas(1, 3))
+    body = small.email_bodies(body_budget(MAX_BYTES))[0]
+    pending = [(1, 'first', body, 'html', 0), (2, 'second', body, 'html', 0), (3, 'third', 'text', 'plain', 0)]
+
+    messages = batch_notifications(pending, MAX_BYTES)
+    assert [message[0] for message in messages] == [[1, 2], [3]]
+    merged = messages[0][2]
+    assert merged.startswith(HTML_START) and merged.endswith(HTML_END)
+    assert merged.count('<html>') == 1 and merged.count('</body>') == 1
+    assert merged.count('<hr>') == 1
+
+
+def test_batches_fit_in_a_message(report):
+    bodies = report.email_bodies(body_budget(MAX_BYTES))
+    pending = [(number, f'part {number}', body, 'html', 0) for number, body in enumerate(bodies)]
+    for _, _, body, subtype in batch_notifications(pending, MAX_BYTES):
+        assert encoded_size(body, subtype) <= MAX_BYTES
+
+
+def queue(conn, count):
+    # Alternating subtypes, so each notification is a message of its own
+    now = int(time.time())
+    db_add_notifications(conn, [(now, f'digest {number}', f'body {number}', ('plain', 'html')[number % 2])
+                                for number in range(count)])
+
+
+def outbox(conn):
+    return conn.execute("SELECT sent_at IS NOT NULL, attempts, next_attempt, last_error FROM Outbox "
+                        "ORDER BY id").fetchall()
+
+
+def test_batches_share_one_connection(conn):
+    queue(conn, 3)
+    with SMTPStub() as stub:
+        assert send_outbox(conn, stub.host, stub.port, starttls=False, password='') == (3, 0)
+    assert stub.connections == 1
+    assert [message_from_bytes(message)['Subject'] for message in stub.messages] == \
+        ['digest 0', 'digest 1', 'digest 2']
+    assert [row[0] for row in outbox(conn)] == [1, 1, 1]
+    # Nothing left to send
+    assert send_outbox(conn, stub.host, stub.port, starttls=False, password='') == (0, 0)
+
+
+def test_refused_connection_backs_off_and_retries(conn):
+    queue(conn, 2)
+    with SMTPStub() as closed:
+        pass  # nothing listens on its port any more
+
+    before = int(time.time())
+    assert send_outbox(conn, closed.host, closed.port, starttls=False, password='') == (0, 2)
+    after = int(time.time())
+    for sent, attempts, next_attempt, last_error in outbox(conn):
+        assert not sent and attempts == 1 and last_error
+        assert before + retry_after(0) <= next_attempt <= after + retry_after(0)
+
+    with SMTPStub() as stub:
+        # Not due yet
+        assert send_outbox(conn, stub.host, stub.port, starttls=False, password='') == (0, 0)
+        # Once the backoff has passed they are delivered
+        conn.execute("UPDATE Outbox SET next_attempt=next_attempt-?", (retry_after(0),))
+        conn.commit()
+        assert send_outbox(conn, stub.host, stub.port, starttls=False, password='') == (2, 0)
+    assert stub.connections == 1 and len(stub.messages) == 2
+    assert [row[:2] for row in outbox(conn)] == [(1, 1), (1, 1)]
+    assert [row[3] for row in outbox(conn)] == [None, None]
@@ -0,0 +1,109 @@
+# tests/test_reconcile.py
+#
+# reconcile_rows (the set-based diff) against the nested iterrows scans it
+# replaced in get_url_data, on the same database and page rows.
+
+import pytest
+
+from db.database_operations import (db_add_search_string, db_get_search_string_id, db_add_found_items,
+                                    db_get_found_items)
+from retrieval.parser import ResultRow
+from retrieval.retrieval import reconcile_rows
+
+
+def nested_scan_diff(db_items, rows):
+    # The original logic: for every database row scan the page, for every
+    # page row scan the database (df.iterrows() over the page rows)
+    items_to_delete = []
+    for db_item in db_items:
+        db_subject, db_poster, db_item_group = db_item[3], db_item[4], db_item[5]
+        item_exists_in_website = any(
+            (db_subject == row.Subject and
+             db_poster == row.Poster and
+             db_item_group == row.ItemGroup)
+            for row in rows
+        )
+        if not item_exists_in_website:
+            items_to_delete.append(db_item[0])
+
+    delta_list = []
+    for row in rows:
+        item_exists_in_db = any(
+            item[3] == row.Subject and
+            item[4] == row.Poster and
+            item[5] == row.ItemGroup
+            for item in db_items
+        )
+        if not item_exists_in_db:
+            delta_list.append({'ItemIndex': row.ItemIndex, 'Subject': row.Subject, 'Poster': row.Poster,
+                               'ItemGroup': row.ItemGroup, 'Age': row.Age})
+    return delta_list, items_to_delete
+
+
+def page_row(index, subject, poster='poster@usenet.org', group='alt.binaries.ebook', age='1d'):
+    return ResultRow('', index, subject, '1.0 MB', '', poster, group, age)
+
+
+STORED = [
+    (1, 'Dan Brown - Inferno.epub', 'poster@usenet.org', 'alt.binaries.ebook', '3d'),
+    (2, 'Piers Anthony - Xanth 01.epub', 'poster@usenet.org', 'alt.binaries.ebook', '3d'),
+    (3, 'Robin Hobb - Assassin.epub', 'yenc@power-post.org', 'alt.binaries.e-book', '3d'),
+    (4, 'Iain M. Banks - Culture.epub', 'poster@usenet.org', 'alt.binaries.ebook', '3d'),
+]
+
+PAGES = {
+    'unchanged': [page_row(index, subject, poster, group) for index, subject, poster, group, _ in STORED],
+    'adds and deletes': [
+        page_row(1, 'Dan Brown - Inferno.epub'),
+        page_row(2, 'Terry Pratchett - Discworld.epub'),
+        page_row(3, 'Robin Hobb - Assassin.epub', 'yenc@power-post.org', 'alt.binaries.e-book'),
+        page_row(4, 'Neal Stephenson - Anathem.epub'),
+    ],
+    # Same subject, different poster or group: a different item
+    'poster and group matter': [
+        page_row(1, 'Dan Brown - Inferno.epub', 'other@usenet.org'),
+        page_row(2, 'Piers Anthony - Xanth 01.epub', group='alt.binaries.e-book'),
+    ],
+    'duplicate page rows': [
+        page_row(1, 'Terry Pratchett - Discworld.epub'),
+        page_row(2, 'Terry Pratchett - Discworld.epub'),
+        page_row(3, 'Dan Brown - Inferno.epub'),
+        page_row(4, 'Dan Brown - Inferno.epub'),
+        page_row(5, 'Terry Pratchett - Discworld.epub'),
+    ],
+    'empty page': [],
+}
+
+
+def without_repeats(delta_list):
+    seen = set()
+    kept = []
+    for delta in delta_list:
+        identity = (delta['Subject'], delta['Poster'], delta['ItemGroup'])
+        if identity not in seen:
+            seen.add(identity)
+            kept.append(delta)
+    return kept
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_matches_nested_scan(conn, page):
+    db_add_search_string(conn, 'books')
+    search_id = db_get_search_string_id(conn, 'books')
+    db_add_found_items(conn, search_id, STORED)
+    db_items = db_get_found_items(conn, search_id)
+    rows = PAGES[page]
+
+    expected_delta, expected_delete = nested_scan_diff(db_items, rows)
+    delta_list, items_to_delete = reconcile_rows(conn, search_id, rows)
+
+    assert sorted(items_to_delete) == sorted(expected_delete)
+    # The nested scan added a page's repeated row once per repeat; FoundList
+    # holds each item once (unique ItemKey), so it is now added and
+    # reported once, at its first position
+    assert delta_list == without_repeats(expected_delta)
+
+    # Everything reported is now stored, once
+    stored = {(item[3], item[4], item[5]) for item in db_get_found_items(conn, search_id)}
+    assert {(delta['Subject'], delta['Poster'], delta['ItemGroup']) for delta in delta_list} <= stored
+    assert len(db_get_found_items(conn, search_id)) == len(db_items) + len(delta_list)
@@ -0,0 +1,40 @@
+# tests/test_repository.py
+
+import threading
+import types
+
+from db.database_operations import Database
+
+
+def test_threads_get_their_own_connection(database_path):
+    with Database(database_path) as database:
+        database.add_search_strings(['a', 'b', 'c'])
+        main = database.connection()
+        assert database.connection() is main
+
+        seen = []
+
+        def worker():
+            seen.append((database.connection(), database.get_all_search_strings()))
+            database.release()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert seen[0][0] is not main
+        assert sorted(seen[0][1]) == ['a', 'b', 'c']
+        assert list(database.connections.values()) == [main]
+
+
+def test_reads_iterate_lazily(database_path):
+    with Database(database_path) as database:
+        database.add_search_strings(['a', 'b'])
+        search_id = database.get_search_string_id('a')
+        database.add_found_items(search_id, [(1, 'one', 'poster', 'group', '1d'), (2, 'two', 'poster', 'group', '2d')])
+
+        rows = database.iter_found_items(search_id)
+        assert isinstance(rows, types.GeneratorType)
+        assert [row[3] for row in rows] == ['one', 'two']
+        assert [row[1] for row in database.iter_search_entries()] == ['a', 'b']
+        assert list(database.iterate("SELECT search_string FROM SearchList WHERE id > ?", (search_id,))) == [('b',)]
+    assert database.connections == {}
@@ -0,0 +1,25 @@
+# tests/test_search_list_io.py
+
+import pytest
+
+from db.database_operations import db_get_all_search_strings, import_search_list, export_search_list
+
+
+@pytest.mark.parametrize('name', ['list.csv', 'list.txt'])
+def test_lines_are_imported_whole(conn, tmp_path, name):
+    path = tmp_path / name
+    path.write_text('\ufeffTolkien, J.R.R. epub\n  Piers Anthony epub  \n\n"Dan Brown" epub\nPiers Anthony epub\n',
+                    encoding='utf-8')
+    assert import_search_list(conn, str(path)) == (3, 1)
+    assert sorted(db_get_all_search_strings(conn)) == ['"Dan Brown" epub', 'Piers Anthony epub',
+                                                       'Tolkien, J.R.R. epub']
+
+
+def test_export_round_trips(conn, tmp_path):
+    source = tmp_path / 'list.csv'
+    source.write_text('Tolkien, J.R.R. epub\nPiers Anthony epub\n', encoding='utf-8')
+    import_search_list(conn, str(source))
+
+    exported = tmp_path / 'export.csv'
+    assert export_search_list(conn, str(exported)) == 2
+    assert exported.read_text(encoding='utf-8') == 'Tolkien, J.R.R. epub\nPiers Anthony epub\n'
@@ -0,0 +1,39 @@
+# tests/test_shard.py
+
+from db.database_operations import (db_add_search_strings, db_get_search_string_id, db_create_shard_run,
+                                    db_claim_leases, db_renew_leases, db_complete_leases,
+                                    db_count_pending_leases)
+
+
+def start_run(conn, run_id, count):
+    search_strings = [f"search {n}" for n in range(count)]
+    db_add_search_strings(conn, search_strings)
+    search_ids = [db_get_search_string_id(conn, search_string) for search_string in search_strings]
+    assert db_create_shard_run(conn, run_id, 1000, search_ids)
+    return search_ids
+
+
+def test_leases_are_exclusive_until_they_expire(conn):
+    search_ids = start_run(conn, 'run', 5)
+
+    assert db_claim_leases(conn, 'run', 'a', 3, expires_at=1600, now=1000) == search_ids[:3]
+    assert db_claim_leases(conn, 'run', 'b', 3, expires_at=1700, now=1100) == search_ids[3:]
+    assert db_claim_leases(conn, 'run', 'c', 3, expires_at=1800, now=1200) == []
+
+    # Worker a dies; once its lease has expired its searches go to the next claimant
+    assert db_claim_leases(conn, 'run', 'c', 3, expires_at=2200, now=1600) == []
+    assert db_claim_leases(conn, 'run', 'c', 3, expires_at=2201, now=1601) == search_ids[:3]
+    assert db_count_pending_leases(conn, 'run') == 5
+
+
+def test_renewed_and_done_leases_are_not_reclaimed(conn):
+    search_ids = start_run(conn, 'run', 4)
+
+    assert db_claim_leases(conn, 'run', 'a', 2, expires_at=1600, now=1000) == search_ids[:2]
+    assert db_claim_leases(conn, 'run', 'b', 2, expires_at=1600, now=1000) == search_ids[2:]
+    assert db_renew_leases(conn, 'run', 'a', 2500)
+    assert db_complete_leases(conn, 'run', 'b', search_ids[2:], {}, now=1500)
+
+    assert db_claim_leases(conn, 'run', 'c', 4, expires_at=2600, now=2000) == []
+    assert db_count_pending_leases(conn, 'run') == 2
+    assert db_claim_leases(conn, 'run', 'c', 4, expires_at=3100, now=2501) == search_ids[:2]